@@ -0,0 +1,497 @@
+from const import *
+from square import Square
+from piece import *
+from move import Move
+
+#colors
+WHITE = 0
+BLACK = 1
+
+#piece kinds, a piece set is indexed by color * 6 + kind
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+KINDS = {Pawn: PAWN, Knight: KNIGHT, Bishop: BISHOP, Rook: ROOK, Queen: QUEEN, King: KING}
+PIECES = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+#move flags, a move is the 16 bit int  from | to << 6 | flag << 12
+QUIET = 0
+DOUBLE_PUSH = 1
+CASTLE = 2
+EN_PASSANT = 3
+PROMO_KNIGHT = 4
+PROMO_BISHOP = 5
+PROMO_ROOK = 6
+PROMO_QUEEN = 7
+PROMOTION_NAMES = {PROMO_KNIGHT: 'knight', PROMO_BISHOP: 'bishop', PROMO_ROOK: 'rook', PROMO_QUEEN: 'queen'}
+
+#castling rights
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+FULL = (1 << 64) - 1
+
+#ray directions as (row, col) steps, squares are numbered row * 8 + col like Board.squares
+DIRECTIONS = [(-1, 0), (1, 0), (0, 1), (0, -1), (-1, 1), (-1, -1), (1, 1), (1, -1)]
+ROOK_DIRS = [0, 1, 2, 3]
+BISHOP_DIRS = [4, 5, 6, 7]
+#rays that run towards higher square numbers find their first blocker with the lowest bit
+POSITIVE = [dr * 8 + dc > 0 for dr, dc in DIRECTIONS]
+
+
+def _jumps(steps):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dr, dc in steps:
+            if Square.in_range(row + dr, col + dc):
+                bb |= 1 << ((row + dr) * 8 + col + dc)
+        table.append(bb)
+    return table
+
+
+def _rays():
+    rays = []
+    for dr, dc in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            row, col = divmod(sq, 8)
+            bb = 0
+            row, col = row + dr, col + dc
+            while Square.in_range(row, col):
+                bb |= 1 << (row * 8 + col)
+                row, col = row + dr, col + dc
+            table.append(bb)
+        rays.append(table)
+    return rays
+
+
+KNIGHT_ATTACKS = _jumps([(-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1)])
+KING_ATTACKS = _jumps(DIRECTIONS)
+#white pawns move up the board (to lower rows), black pawns down
+PAWN_ATTACKS = [_jumps([(-1, -1), (-1, 1)]), _jumps([(1, -1), (1, 1)])]
+RAYS = _rays()
+
+#castling rights that survive a move touching a square
+CASTLE_MASK = [15] * 64
+CASTLE_MASK[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLE_MASK[63] = 15 & ~WHITE_KINGSIDE
+CASTLE_MASK[56] = 15 & ~WHITE_QUEENSIDE
+CASTLE_MASK[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLE_MASK[7] = 15 & ~BLACK_KINGSIDE
+CASTLE_MASK[0] = 15 & ~BLACK_QUEENSIDE
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def ray_attacks(sq, occupied, dirs):
+    attacks = 0
+    for d in dirs:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE[d]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    return ray_attacks(sq, occupied, BISHOP_DIRS)
+
+
+def rook_attacks(sq, occupied):
+    return ray_attacks(sq, occupied, ROOK_DIRS)
+
+
+def encode_move(fr, to, flag=QUIET):
+    return fr | to << 6 | flag << 12
+
+
+class BitBoard:
+    """
+    Compact chess position made of twelve 64 bit piece sets.
+
+    Attributes:
+        pieces (list): Twelve piece sets, indexed by color * 6 + kind.
+        occupancy (list): The squares occupied by white and by black.
+        occupied (int): The squares occupied by any piece.
+        mailbox (list): The piece set index on each of the 64 squares, -1 when empty.
+        side (int): The color to move (WHITE or BLACK).
+        castling (int): The castling rights as WHITE_KINGSIDE | WHITE_QUEENSIDE | ... flags.
+        ep (int): The en passant target square, -1 if there is none.
+
+    Methods:
+        from_board(board, color=None): Creates a bitboard position from a Board.
+        to_board(): Creates a Board from the bitboard position.
+        is_attacked(sq, by): Checks if a square is attacked by the given color.
+        in_check(side): Checks if the king of the given color is attacked.
+        pseudo_legal_moves(origins): Generates moves without checking checks.
+        legal_moves(origins): Generates all legal moves.
+        make(move): Plays a move and returns the state needed to undo it.
+        unmake(move, undo): Takes back a move.
+        perft(depth): Counts the leaf nodes of the move tree.
+    """
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox = [-1] * 64
+        self.side = WHITE
+        self.castling = 0
+        self.ep = -1
+
+    @classmethod
+    def from_board(cls, board, color=None):
+        '''
+            Create the bitboard position of a Board, with the given color or else the board's next player to move.
+
+        '''
+        if color is None:
+            color = board.next_player
+        bb = cls()
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = board.squares[row][col].piece
+                if piece is not None:
+                    bb._put(0 if piece.color == 'white' else 1, KINDS[type(piece)], row * 8 + col)
+        bb.side = WHITE if color == 'white' else BLACK
+
+        #castling rights, from the moved flags of kings and rooks
+        for side, row, king_right, queen_right in ((WHITE, 7, WHITE_KINGSIDE, WHITE_QUEENSIDE), (BLACK, 0, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+            king = board.squares[row][4].piece
+            if isinstance(king, King) and not king.moved and bb.mailbox[row * 8 + 4] == side * 6 + KING:
+                for col, right in ((7, king_right), (0, queen_right)):
+                    rook = board.squares[row][col].piece
+                    if isinstance(rook, Rook) and not rook.moved and bb.mailbox[row * 8 + col] == side * 6 + ROOK:
+                        bb.castling |= right
+
+        #en passant, from the pawn of the other color that just made a double step
+        for row in (3, 4):
+            for col in range(COLS):
+                piece = board.squares[row][col].piece
+                if isinstance(piece, Pawn) and piece.en_passant and piece.color != color:
+                    bb.ep = (row - piece.dir) * 8 + col
+        return bb
+
+    def to_board(self):
+        '''
+            Create a Board with the pieces, moved flags and en passant flags of this position.
+
+        '''
+        from board import Board
+        board = Board(empty=True)
+        for sq in range(64):
+            p = self.mailbox[sq]
+            if p < 0:
+                continue
+            row, col = divmod(sq, 8)
+            color = 'white' if p < 6 else 'black'
+            piece = PIECES[p % 6](color)
+            if isinstance(piece, Pawn):
+                piece.moved = row != (6 if color == 'white' else 1)
+            else:
+                piece.moved = True
+            board.squares[row][col].piece = piece
+
+        #unmoved kings and rooks give the castling rights back
+        for rights, row, col in ((WHITE_KINGSIDE | WHITE_QUEENSIDE, 7, 4), (WHITE_KINGSIDE, 7, 7), (WHITE_QUEENSIDE, 7, 0),
+                                 (BLACK_KINGSIDE | BLACK_QUEENSIDE, 0, 4), (BLACK_KINGSIDE, 0, 7), (BLACK_QUEENSIDE, 0, 0)):
+            if self.castling & rights:
+                board.squares[row][col].piece.moved = False
+
+        if self.ep >= 0:
+            row, col = divmod(self.ep, 8)
+            row += 1 if self.side == WHITE else -1
+            board.squares[row][col].piece.en_passant = True
+        board.next_player = 'white' if self.side == WHITE else 'black'
+        board.find_kings()
+        board.key = board.compute_hash()
+        return board
+
+    def _put(self, side, kind, sq):
+        bit = 1 << sq
+        self.pieces[side * 6 + kind] |= bit
+        self.occupancy[side] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = side * 6 + kind
+
+    def king_square(self, side):
+        return lsb(self.pieces[side * 6 + KING])
+
+    def is_attacked(self, sq, by):
+        pieces = self.pieces
+        base = by * 6
+        #a pawn of the attacking color stands where a pawn of the other color would capture
+        if PAWN_ATTACKS[by ^ 1][sq] & pieces[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & pieces[base + KING]:
+            return True
+        queens = pieces[base + QUEEN]
+        diagonal = pieces[base + BISHOP] | queens
+        if diagonal and bishop_attacks(sq, self.occupied) & diagonal:
+            return True
+        straight = pieces[base + ROOK] | queens
+        if straight and rook_attacks(sq, self.occupied) & straight:
+            return True
+        return False
+
+    def in_check(self, side=None):
+        if side is None:
+            side = self.side
+        return self.is_attacked(self.king_square(side), side ^ 1)
+
+    def pseudo_legal_moves(self, origins=FULL):
+        '''
+            Generate all moves of the side to move from the origin squares, without looking at checks.
+
+        '''
+        moves = []
+        us = self.side
+        them = us ^ 1
+        base = us * 6
+        own = self.occupancy[us]
+        enemy = self.occupancy[them]
+        occupied = self.occupied
+        empty = ~occupied
+
+        #pawns
+        step = -8 if us == WHITE else 8
+        start_row = 6 if us == WHITE else 1
+        last_row = 0 if us == WHITE else 7
+        pawns = self.pieces[base + PAWN] & origins
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            fr = bit.bit_length() - 1
+            row = fr >> 3
+            targets = PAWN_ATTACKS[us][fr] & enemy
+            to = fr + step
+            if (1 << to) & empty:
+                targets |= 1 << to
+                if row == start_row and (1 << (to + step)) & empty:
+                    moves.append(fr | (to + step) << 6 | DOUBLE_PUSH << 12)
+            while targets:
+                t = targets & -targets
+                targets ^= t
+                to = t.bit_length() - 1
+                if to >> 3 == last_row:
+                    for flag in (PROMO_QUEEN, PROMO_ROOK, PROMO_BISHOP, PROMO_KNIGHT):
+                        moves.append(fr | to << 6 | flag << 12)
+                else:
+                    moves.append(fr | to << 6)
+            if self.ep >= 0 and PAWN_ATTACKS[us][fr] & (1 << self.ep):
+                moves.append(fr | self.ep << 6 | EN_PASSANT << 12)
+
+        #pieces
+        for kind in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            bb = self.pieces[base + kind] & origins
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                fr = bit.bit_length() - 1
+                if kind == KNIGHT:
+                    targets = KNIGHT_ATTACKS[fr]
+                elif kind == BISHOP:
+                    targets = bishop_attacks(fr, occupied)
+                elif kind == ROOK:
+                    targets = rook_attacks(fr, occupied)
+                elif kind == QUEEN:
+                    targets = bishop_attacks(fr, occupied) | rook_attacks(fr, occupied)
+                else:
+                    targets = KING_ATTACKS[fr]
+                targets &= ~own
+                while targets:
+                    t = targets & -targets
+                    targets ^= t
+                    moves.append(fr | (t.bit_length() - 1) << 6)
+
+        #castling, the king may not castle out of, through or into check
+        king = self.pieces[base + KING] & origins
+        if king and self.castling:
+            if us == WHITE:
+                rights = ((WHITE_KINGSIDE, 60, 62, (61, 62), (61, 62)), (WHITE_QUEENSIDE, 60, 58, (57, 58, 59), (59, 58)))
+            else:
+                rights = ((BLACK_KINGSIDE, 4, 6, (5, 6), (5, 6)), (BLACK_QUEENSIDE, 4, 2, (1, 2, 3), (3, 2)))
+            for right, fr, to, between, path in rights:
+                if self.castling & right and king == 1 << fr:
+                    if any(occupied & (1 << sq) for sq in between):
+                        continue
+                    if self.is_attacked(fr, them) or any(self.is_attacked(sq, them) for sq in path):
+                        continue
+                    moves.append(fr | to << 6 | CASTLE << 12)
+        return moves
+
+    def legal_moves(self, origins=FULL):
+        '''
+            Generate all legal moves of the side to move from the origin squares.
+
+        '''
+        legal = []
+        us = self.side
+        for move in self.pseudo_legal_moves(origins):
+            undo = self.make(move)
+            if not self.is_attacked(self.king_square(us), us ^ 1):
+                legal.append(move)
+            self.unmake(move, undo)
+        return legal
+
+    def make(self, move):
+        '''
+            Play a move in place and return the state unmake needs to take it back.
+
+        '''
+        fr = move & 63
+        to = (move >> 6) & 63
+        flag = move >> 12
+        us = self.side
+        them = us ^ 1
+        pieces = self.pieces
+        mailbox = self.mailbox
+        occupancy = self.occupancy
+
+        p = mailbox[fr]
+        captured = mailbox[to]
+        undo = (captured, self.castling, self.ep)
+        fr_bit = 1 << fr
+        to_bit = 1 << to
+
+        pieces[p] ^= fr_bit | to_bit
+        occupancy[us] ^= fr_bit | to_bit
+        mailbox[fr] = -1
+        mailbox[to] = p
+        if captured >= 0:
+            pieces[captured] ^= to_bit
+            occupancy[them] ^= to_bit
+
+        if flag == EN_PASSANT:
+            cap = to + (8 if us == WHITE else -8)
+            cap_bit = 1 << cap
+            pieces[them * 6 + PAWN] ^= cap_bit
+            occupancy[them] ^= cap_bit
+            mailbox[cap] = -1
+        elif flag == CASTLE:
+            if to > fr:
+                rook_fr, rook_to = fr + 3, fr + 1
+            else:
+                rook_fr, rook_to = fr - 4, fr - 1
+            rook_bits = (1 << rook_fr) | (1 << rook_to)
+            pieces[us * 6 + ROOK] ^= rook_bits
+            occupancy[us] ^= rook_bits
+            mailbox[rook_to] = mailbox[rook_fr]
+            mailbox[rook_fr] = -1
+        elif flag >= PROMO_KNIGHT:
+            promoted = us * 6 + flag - PROMO_KNIGHT + KNIGHT
+            pieces[p] ^= to_bit
+            pieces[promoted] ^= to_bit
+            mailbox[to] = promoted
+
+        self.ep = (fr + to) >> 1 if flag == DOUBLE_PUSH else -1
+        self.castling &= CASTLE_MASK[fr] & CASTLE_MASK[to]
+        self.occupied = occupancy[0] | occupancy[1]
+        self.side = them
+        return undo
+
+    def unmake(self, move, undo):
+        fr = move & 63
+        to = (move >> 6) & 63
+        flag = move >> 12
+        captured, self.castling, self.ep = undo
+        them = self.side
+        us = them ^ 1
+        self.side = us
+        pieces = self.pieces
+        mailbox = self.mailbox
+        occupancy = self.occupancy
+
+        fr_bit = 1 << fr
+        to_bit = 1 << to
+        p = mailbox[to]
+        if flag >= PROMO_KNIGHT:
+            pieces[p] ^= to_bit
+            p = us * 6 + PAWN
+            pieces[p] ^= to_bit
+
+        pieces[p] ^= fr_bit | to_bit
+        occupancy[us] ^= fr_bit | to_bit
+        mailbox[fr] = p
+        mailbox[to] = captured
+        if captured >= 0:
+            pieces[captured] ^= to_bit
+            occupancy[them] ^= to_bit
+
+        if flag == EN_PASSANT:
+            cap = to + (8 if us == WHITE else -8)
+            cap_bit = 1 << cap
+            pieces[them * 6 + PAWN] ^= cap_bit
+            occupancy[them] ^= cap_bit
+            mailbox[cap] = them * 6 + PAWN
+        elif flag == CASTLE:
+            if to > fr:
+                rook_fr, rook_to = fr + 3, fr + 1
+            else:
+                rook_fr, rook_to = fr - 4, fr - 1
+            rook_bits = (1 << rook_fr) | (1 << rook_to)
+            pieces[us * 6 + ROOK] ^= rook_bits
+            occupancy[us] ^= rook_bits
+            mailbox[rook_fr] = mailbox[rook_to]
+            mailbox[rook_to] = -1
+
+        self.occupied = occupancy[0] | occupancy[1]
+
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            undo = self.make(move)
+            nodes += self.perft(depth - 1)
+            self.unmake(move, undo)
+        return nodes
+
+    def to_board_move(self, board, move):
+        '''
+            Create the Move object of Board for a bitboard move.
+
+        '''
+        fr = move & 63
+        to = (move >> 6) & 63
+        row, col = divmod(fr, 8)
+        final_row, final_col = divmod(to, 8)
+        flag = move >> 12
+        if flag == EN_PASSANT:
+            final_piece = board.squares[row][final_col].piece
+        else:
+            final_piece = board.squares[final_row][final_col].piece
+        promotion = PROMOTION_NAMES.get(flag)
+        return Move(Square(row, col), Square(final_row, final_col, final_piece), promotion)
+
+    def find_move(self, row, col, final_row, final_col):
+        '''
+            Find the pseudo legal bitboard move between two squares of Board, None if there is none.
+
+        '''
+        fr = row * 8 + col
+        to = final_row * 8 + final_col
+        for move in self.pseudo_legal_moves(1 << fr):
+            if (move >> 6) & 63 == to:
+                return move
+        return None
@@ -1,10 +1,65 @@
 from const import *
 from square import Square
 from piece import *
-import os
 from move import *
-import copy
-from sound import Sound
+from bitboard import BitBoard
+from zobrist import PIECE_KEYS, SIDE_KEY, EN_PASSANT_KEYS, castling_key
+
+FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+FEN_LETTERS = {'pawn': 'p', 'knight': 'n', 'bishop': 'b', 'rook': 'r', 'queen': 'q', 'king': 'k'}
+#expands the digits of a FEN placement into dots and drops the rank separators, '/' or the '-' of model.label_to_fen
+FEN_EXPAND = str.maketrans({**{str(n): '.' * n for n in range(1, 9)}, '/': '', '-': ''})
+#castling field letter: (castling right bit, row, rook col)
+FEN_CASTLING = {'K': (1, 7, 7), 'Q': (2, 7, 0), 'k': (4, 0, 7), 'q': (8, 0, 0)}
+
+
+def parse_fen(fen):
+    '''
+        Split a FEN string into plain values without creating any pieces, for tools that read many positions.
+
+        Return (placement, side, castling, en_passant, halfmove, fullmove): placement is a 64 character string from a8
+        to h1 with '.' on empty squares, side 'w' or 'b', castling the rights as bits like Board.castling_rights(),
+        en_passant the row * 8 + col of the en passant square or -1. Missing clock fields default to 0 and 1.
+        Raises ValueError on a broken FEN.
+
+    '''
+    fields = fen.split()
+    if not fields:
+        raise ValueError(f'empty FEN {fen!r}')
+    placement = fields[0].translate(FEN_EXPAND)
+    if len(placement) != 64:
+        raise ValueError(f'FEN placement does not have 64 squares: {fen!r}')
+    side = fields[1] if len(fields) > 1 else 'w'
+    if side not in ('w', 'b'):
+        raise ValueError(f'FEN side to move is not w or b: {fen!r}')
+    castling = 0
+    if len(fields) > 2 and fields[2] != '-':
+        for char in fields[2]:
+            if char not in FEN_CASTLING:
+                raise ValueError(f'FEN castling field has an unknown letter {char!r}: {fen!r}')
+            castling |= FEN_CASTLING[char][0]
+    en_passant = -1
+    if len(fields) > 3 and fields[3] != '-':
+        ep = fields[3]
+        #the en passant square is behind a pawn that just made a double step, on rank 3 or 6
+        if len(ep) != 2 or ep[0] not in 'abcdefgh' or ep[1] not in '36':
+            raise ValueError(f'FEN en passant square is not a-h on rank 3 or 6: {fen!r}')
+        en_passant = (8 - int(ep[1])) * 8 + 'abcdefgh'.index(ep[0])
+    halfmove = int(fields[4]) if len(fields) > 4 else 0
+    fullmove = int(fields[5]) if len(fields) > 5 else 1
+    return placement, side, castling, en_passant, halfmove, fullmove
+
+
+def read_fens(path):
+    '''
+        Parse the FEN on every non-empty line of a file with parse_fen, one position at a time.
+
+    '''
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield parse_fen(line)
+
 
 class Board:
 
@@ -14,84 +69,392 @@ class Board:
     Attributes:
         squares (list): A 2D list representing the squares on the chess board.
         last_move (Move or None): The last move made on the board.
+        use_bitboard (bool): Whether calc_moves and in_check check legality on a BitBoard.
+        bitboard_cache (tuple or None): The BitBoard of the position and its legal moves by origin square, with the key
+            and color they were generated for.
+        kings (dict): The (row, col) position of the king of each color.
+        next_player (str): The color to move ('white' or 'black').
+        key (int): The 64 bit Zobrist key of the position, updated by make_move and unmake_move.
+        check_hash (bool): Whether every make_move and unmake_move compares key with compute_hash().
+        legal_cache (dict): The legal moves of the next player by (row, col) of the moving piece.
+        legal_cache_key (int or None): The key of the position legal_cache was generated for.
+        halfmove (int): The half moves since the last capture or pawn move, for the fifty move rule.
+        fullmove (int): The number of the move, starting at 1 and counted up after every black move.
 
     Methods:
-        move(piece, move, testing=False): Moves a piece on the board.
+        from_fen(fen): Creates a board from a FEN string.
+        to_fen(): Returns the FEN string of the position.
+        move(piece, move): Moves a piece on the board and returns the Undo record.
+        make_move(piece, move): Plays a move in place and returns an Undo record.
+        unmake_move(undo): Takes back a move made with make_move.
+        legal_moves(color=None): Returns all legal moves of a color as (piece, move) pairs.
+        generate_legal_moves(color=None): Yields the legal moves of a color lazily, without touching Piece.moves.
+        load_moves(piece, row, col): Sets the legal moves of a piece from the legal move cache of the position.
         valid_move(piece, move): Checks if a move is valid for a given piece.
-        check_promotion(piece, final): Checks for pawn promotion and promotes if necessary.
+        check_promotion(piece, final, promotion=None): Checks for pawn promotion and promotes if necessary.
         castling(initial, final): Checks if castling is possible.
         set_true_en_passant(piece): Sets en passant flag for the given pawn piece to true.
         in_check(piece, move): Checks if a move puts the player's king in check.
-        calc_moves(piece, row, col, bool=True): Calculates all possible moves for a given piece.
+        king_attacked(color): Checks if the king of the given color is attacked.
+        is_square_attacked(row, col, by_color): Checks if a square is attacked by any piece of a color.
+        find_kings(): Searches the board for both kings and caches their positions.
+        hash(): Returns the Zobrist key of the position.
+        compute_hash(): Computes the Zobrist key of the position from scratch.
+        castling_rights(): Returns the castling rights given by the moved flags of kings and rooks.
+        bitboard_moves(color): Returns the BitBoard of the position and the legal moves of a color on it, cached by key.
+        calc_moves(piece, row, col, bool=True): Calculates all possible moves for a given piece into piece.moves.
+        generate_moves(piece, row, col, bool=True): Yields the possible moves of a piece without storing them.
         _create(): Creates the initial layout of the chess board.
         _add_pieces(color): Adds pieces of the specified color to the board.
     """
 
-    def __init__(self):
+    KNIGHT_STEPS = ((-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1))
+    KING_STEPS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+    STRAIGHT_STEPS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+    DIAGONAL_STEPS = ((-1, 1), (-1, -1), (1, 1), (1, -1))
+
+    def __init__(self, empty=False):
         self.squares = [[0, 0, 0, 0, 0, 0, 0, 0] for col in range(COLS)]
         self.last_move = None
+        self.use_bitboard = False
+        self.bitboard_cache = None
+        self.kings = {}
+        self.next_player = 'white'
+        self.check_hash = False
+        self.legal_cache = {}
+        self.legal_cache_key = None
+        self.halfmove = 0
+        self.fullmove = 1
         self._create()
-        self._add_pieces('white')
-        self._add_pieces('black')
+        if not empty:
+            self._add_pieces('white')
+            self._add_pieces('black')
+        self.find_kings()
+        self.key = self.compute_hash()
+
+    @classmethod
+    def from_fen(cls, fen):
+        '''
+            Create a board from a FEN string: pieces, side to move, castling rights, en passant square and clocks.
+
+            Ranks may be separated by '-' like the FENs of model.label_to_fen. Raises ValueError on a broken FEN.
+
+        '''
+        placement, side, castling, en_passant, halfmove, fullmove = parse_fen(fen)
+        board = cls(empty=True)
+        squares = board.squares
+        for i, char in enumerate(placement):
+            if char == '.':
+                continue
+            row = i >> 3
+            kind = FEN_PIECES.get(char.lower())
+            if kind is None:
+                raise ValueError(f'unknown FEN piece {char!r}: {fen!r}')
+            piece = kind('white' if char.isupper() else 'black')
+            #pawns only keep their double step on the starting row, kings and rooks get it back from the castling field
+            if kind is Pawn:
+                piece.moved = row != (6 if piece.color == 'white' else 1)
+            else:
+                piece.moved = True
+            squares[row][i & 7].piece = piece
+
+        for bit, row, col in FEN_CASTLING.values():
+            if castling & bit:
+                color = 'white' if row == 7 else 'black'
+                king, rook = squares[row][4].piece, squares[row][col].piece
+                if not (isinstance(king, King) and isinstance(rook, Rook) and king.color == rook.color == color):
+                    raise ValueError(f'FEN castling right without king and rook: {fen!r}')
+                king.moved = rook.moved = False
+
+        if en_passant >= 0:
+            #the pawn that made the double step stands one row behind the en passant square
+            row = (en_passant >> 3) + (1 if side == 'w' else -1)
+            pawn = squares[row][en_passant & 7].piece if row == (3 if side == 'w' else 4) else None
+            if not isinstance(pawn, Pawn) or (pawn.color == 'white') == (side == 'w'):
+                raise ValueError(f'FEN en passant square without a pawn: {fen!r}')
+            pawn.en_passant = True
+
+        board.next_player = 'white' if side == 'w' else 'black'
+        board.halfmove = halfmove
+        board.fullmove = fullmove
+        board.find_kings()
+        board.key = board.compute_hash()
+        return board
+
+    def to_fen(self):
+        '''
+            Return the FEN string of the position.
+
+        '''
+        ranks = []
+        en_passant = '-'
+        for row in range(ROWS):
+            rank = ''
+            empty = 0
+            for col in range(COLS):
+                p = self.squares[row][col].piece
+                if p is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[p.name]
+                rank += letter.upper() if p.color == 'white' else letter
+                if isinstance(p, Pawn) and p.en_passant:
+                    en_passant = f'{"abcdefgh"[col]}{ROWS - row + p.dir}'
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights = self.castling_rights()
+        castling = ''.join(char for char, (bit, row, col) in FEN_CASTLING.items() if rights & bit) or '-'
+        side = 'w' if self.next_player == 'white' else 'b'
+        return f'{"/".join(ranks)} {side} {castling} {en_passant} {self.halfmove} {self.fullmove}'
+
+    def move(self, piece, move):
+        undo = self.make_move(piece, move)
+
+        #clear valid moves
+        piece.clear_moves()
+
+        return undo
+
+    def make_move(self, piece, move):
+        '''
+            Play a move in place and return an Undo record that unmake_move uses to take it back.
 
-    def move(self, piece, move, testing = False):
+        '''
         initial = move.initial
         final = move.final
+        undo = Undo(piece, move, piece.moved, self.last_move)
+        undo.key = self.key
+        undo.halfmove = self.halfmove
+        rights = self.castling_rights()
+        key = self.key ^ SIDE_KEY ^ PIECE_KEYS[(piece.color, piece.name)][initial.row * 8 + initial.col]
 
-        en_passant_empty = self.squares[final.row][final.col].isempty()
+        initial_sqr = self.squares[initial.row][initial.col]
+        final_sqr = self.squares[final.row][final.col]
 
-        #console board move update
-        self.squares[initial.row][initial.col].piece = None
-        self.squares[final.row][final.col].piece = piece
+        #normal capture
+        if final_sqr.has_piece():
+            undo.captured = final_sqr.piece
+            undo.captured_square = final_sqr
 
-        
-
-        
+        #console board move update
+        initial_sqr.piece = None
+        final_sqr.piece = piece
 
-        
         if isinstance(piece, Pawn):
-            #enpassant capoture
-        
+            #enpassant capture
             diff = final.col - initial.col
-            if diff != 0 and en_passant_empty:
-                self.squares[initial.row][initial.col + diff].piece = None
-                self.squares[final.row][final.col].piece = piece
-                if not testing:
-                    sound = Sound(os.path.join('assets/sounds/siuuu.mp3'))
-                    sound.play()
-   
+            if diff != 0 and undo.captured is None:
+                captured_sqr = self.squares[initial.row][initial.col + diff]
+                undo.captured = captured_sqr.piece
+                undo.captured_square = captured_sqr
+                captured_sqr.piece = None
 
             #pawn promotion
-            else:
-                self.check_promotion(piece, final)
+            elif final.row == 0 or final.row == 7:
+                self.check_promotion(piece, final, move.promotion)
+                undo.promoted = final_sqr.piece
+
+        if undo.captured is not None:
+            sqr = undo.captured_square
+            key ^= PIECE_KEYS[(undo.captured.color, undo.captured.name)][sqr.row * 8 + sqr.col]
+        landed = final_sqr.piece
+        key ^= PIECE_KEYS[(landed.color, landed.name)][final.row * 8 + final.col]
 
         #king casteling
         if isinstance(piece, King):
-            if self.castling(initial, final) and not testing:
-                diff = final.col - initial.col
-                
-                if diff < 0:
-                    rook = piece.left_rook
-                else:
-                    rook = piece.right_rook     
-                self.move(rook, rook.moves[-1])
-
+            self.kings[piece.color] = (final.row, final.col)
+        if isinstance(piece, King) and self.castling(initial, final):
+            if final.col < initial.col:
+                rook_initial, rook_final = self.squares[initial.row][0], self.squares[initial.row][3]
+            else:
+                rook_initial, rook_final = self.squares[initial.row][7], self.squares[initial.row][5]
+            rook = rook_initial.piece
+            undo.rook = rook
+            undo.rook_initial = rook_initial
+            undo.rook_final = rook_final
+            undo.rook_moved = rook.moved
+            rook_initial.piece = None
+            rook_final.piece = rook
+            rook.moved = True
+            rook_keys = PIECE_KEYS[(rook.color, rook.name)]
+            key ^= rook_keys[rook_initial.row * 8 + rook_initial.col] ^ rook_keys[rook_final.row * 8 + rook_final.col]
+
+        #en passant rights only last for one move
+        captured = undo.captured
+        if isinstance(captured, Pawn) and captured.en_passant:
+            captured.en_passant = False
+            undo.en_passant.append(captured)
+            key ^= EN_PASSANT_KEYS[undo.captured_square.col]
+        for row in range(ROWS):
+            for col in range(COLS):
+                p = self.squares[row][col].piece
+                if isinstance(p, Pawn) and p.en_passant:
+                    p.en_passant = False
+                    undo.en_passant.append(p)
+                    key ^= EN_PASSANT_KEYS[col]
+        if isinstance(piece, Pawn) and abs(final.row - initial.row) == 2:
+            piece.en_passant = True
+            key ^= EN_PASSANT_KEYS[final.col]
 
         #move
         piece.moved = True
 
-        #clear valid moves
-        piece.clear_moves()
+        #castling rights lost by this move
+        key ^= castling_key(rights ^ self.castling_rights())
+
+        #captures and pawn moves reset the fifty move counter
+        if undo.captured is not None or isinstance(piece, Pawn):
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        if self.next_player == 'black':
+            self.fullmove += 1
 
         #set last move
         self.last_move = move
+        self.next_player = 'black' if self.next_player == 'white' else 'white'
+        self.key = key
+        if self.check_hash:
+            self._verify_hash()
+
+        return undo
+
+    def unmake_move(self, undo):
+        '''
+            Take back the move recorded in undo, restoring the board exactly as it was before make_move.
+
+        '''
+        initial = undo.move.initial
+        final = undo.move.final
+        piece = undo.piece
+
+        #pieces back to their squares
+        self.squares[final.row][final.col].piece = None
+        self.squares[initial.row][initial.col].piece = piece
+        if undo.captured is not None:
+            undo.captured_square.piece = undo.captured
+
+        #rook back from castling
+        if undo.rook is not None:
+            undo.rook_final.piece = None
+            undo.rook_initial.piece = undo.rook
+            undo.rook.moved = undo.rook_moved
+
+        if isinstance(piece, King):
+            self.kings[piece.color] = (initial.row, initial.col)
+
+        #en passant rights
+        if isinstance(piece, Pawn):
+            piece.en_passant = False
+        for p in undo.en_passant:
+            p.en_passant = True
+
+        piece.moved = undo.moved
+        self.last_move = undo.last_move
+        self.next_player = 'black' if self.next_player == 'white' else 'white'
+        if self.next_player == 'black':
+            self.fullmove -= 1
+        self.halfmove = undo.halfmove
+        self.key = undo.key
+        if self.check_hash:
+            self._verify_hash()
+
+    def hash(self):
+        return self.key
+
+    def compute_hash(self):
+        '''
+            Compute the Zobrist key of the position from scratch: pieces, side to move, castling rights and en passant.
+
+        '''
+        key = 0
+        for row in range(ROWS):
+            for col in range(COLS):
+                p = self.squares[row][col].piece
+                if p is not None:
+                    key ^= PIECE_KEYS[(p.color, p.name)][row * 8 + col]
+                    if isinstance(p, Pawn) and p.en_passant:
+                        key ^= EN_PASSANT_KEYS[col]
+        if self.next_player == 'black':
+            key ^= SIDE_KEY
+        return key ^ castling_key(self.castling_rights())
+
+    def castling_rights(self):
+        '''
+            Return the castling rights as bits: 1 white kingside, 2 white queenside, 4 black kingside, 8 black queenside.
+
+        '''
+        rights = 0
+        for color, row, bit in (('white', 7, 0), ('black', 0, 2)):
+            king = self.squares[row][4].piece
+            if isinstance(king, King) and king.color == color and not king.moved:
+                for col, shift in ((7, 0), (0, 1)):
+                    rook = self.squares[row][col].piece
+                    if isinstance(rook, Rook) and rook.color == color and not rook.moved:
+                        rights |= 1 << (bit + shift)
+        return rights
+
+    def _verify_hash(self):
+        key = self.compute_hash()
+        if key != self.key:
+            raise RuntimeError(f'incremental hash {self.key:016x} differs from recomputed hash {key:016x}')
+
+    def legal_moves(self, color = None):
+        '''
+            Return all legal moves of a color, by default the next player, as (piece, move) pairs.
+
+        '''
+        return list(self.generate_legal_moves(color))
+
+    def generate_legal_moves(self, color = None):
+        '''
+            Yield the legal moves of a color, by default the next player, as (piece, move) pairs.
+
+            The moves are generated lazily, piece by piece, so a search that stops at the first cutoff skips the rest.
+            Piece.moves is not touched.
+
+        '''
+        if color is None:
+            color = self.next_player
+        squares = self.squares
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = squares[row][col].piece
+                if piece is not None and piece.color == color:
+                    for move in self.generate_moves(piece, row, col):
+                        yield piece, move
+
+    def load_moves(self, piece, row, col):
+        '''
+            Set piece.moves to the legal moves of the piece, looked up in the moves of the next player.
+
+            Those are generated once per position, so selecting pieces again does not recompute anything.
+
+        '''
+        if piece.color != self.next_player:
+            piece.clear_moves()
+            self.calc_moves(piece, row, col, bool = True)
+            return
+
+        if self.legal_cache_key != self.key:
+            self.legal_cache = {}
+            for p, move in self.legal_moves():
+                self.legal_cache.setdefault((move.initial.row, move.initial.col), []).append(move)
+            self.legal_cache_key = self.key
+        piece.moves = list(self.legal_cache.get((row, col), []))
 
     def valid_move(self, piece, move):
         return move in piece.moves
 
-    def check_promotion(self, piece, final):
+    def check_promotion(self, piece, final, promotion = None):
         if final.row == 0 or final.row == 7:
-            self.squares[final.row][final.col].piece = Queen(piece.color)
+            promoted = {'knight': Knight, 'bishop': Bishop, 'rook': Rook}.get(promotion, Queen)
+            self.squares[final.row][final.col].piece = promoted(piece.color)
 
     def castling(self, initial, final):
         return abs(initial.col - final.col) == 2
@@ -106,125 +469,206 @@ class Board:
                 if isinstance(self.squares[row][col].piece, Pawn):
                     self.squares[row][col].piece.en_passant = False
 
-        piece.en_passant = True
+        #only a double step can be captured en passant
+        move = self.last_move
+        piece.en_passant = move is not None and abs(move.final.row - move.initial.row) == 2
+
+    def in_check(self, piece, move):
+        if self.use_bitboard:
+            bb, legal = self.bitboard_moves(piece.color)
+            to = move.final.row * 8 + move.final.col
+            if any((m >> 6) & 63 == to for m in legal.get(move.initial.row * 8 + move.initial.col, ())):
+                return False
+            if bb.find_move(move.initial.row, move.initial.col, move.final.row, move.final.col) is not None:
+                return True
+
+        undo = self.make_move(piece, move)
+        check = self.king_attacked(piece.color)
+        self.unmake_move(undo)
+        return check
+
+    def king_attacked(self, color):
+        '''
+            Check if the king of the given color is attacked by any enemy piece.
 
+        '''
+        if color not in self.kings:
+            return False
+        row, col = self.kings[color]
+        return self.is_square_attacked(row, col, 'black' if color == 'white' else 'white')
 
-    
+    def is_square_attacked(self, row, col, by_color):
+        '''
+            Check if a square is attacked by any piece of the given color, looking outward from the square.
 
-  
-    def in_check(self, piece, move):
-        temp_piece = copy.deepcopy(piece)
-        temp_board = copy.deepcopy(self)
-        temp_board.move(temp_piece, move, testing = True)
+        '''
+        squares = self.squares
+
+        #pawns attack from the row they come from
+        pawn_row = row + 1 if by_color == 'white' else row - 1
+        if 0 <= pawn_row < ROWS:
+            for c in (col-1, col+1):
+                if 0 <= c < COLS:
+                    p = squares[pawn_row][c].piece
+                    if isinstance(p, Pawn) and p.color == by_color:
+                        return True
+
+        #knights and kings
+        for steps, kind in ((self.KNIGHT_STEPS, Knight), (self.KING_STEPS, King)):
+            for row_incr, col_incr in steps:
+                r, c = row + row_incr, col + col_incr
+                if 0 <= r < ROWS and 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if isinstance(p, kind) and p.color == by_color:
+                        return True
+
+        #sliders, the first piece on each ray decides
+        for incrs, kind in ((self.STRAIGHT_STEPS, Rook), (self.DIAGONAL_STEPS, Bishop)):
+            for row_incr, col_incr in incrs:
+                r, c = row + row_incr, col + col_incr
+                while 0 <= r < ROWS and 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if p is not None:
+                        if p.color == by_color and isinstance(p, (kind, Queen)):
+                            return True
+                        break
+                    r += row_incr
+                    c += col_incr
+        return False
 
+    def find_kings(self):
+        self.kings = {}
         for row in range(ROWS):
             for col in range(COLS):
-                if temp_board.squares[row][col].has_enemy_piece(piece.color):
-                    p= temp_board.squares[row][col].piece
-                    temp_board.calc_moves(p, row, col, bool = False)
-                    for m in p.moves:
-                        if isinstance(m.final.piece, King):
-                            return True
-                        
+                p = self.squares[row][col].piece
+                if isinstance(p, King):
+                    self.kings[p.color] = (row, col)
+
+    def bitboard_moves(self, color):
+        '''
+            Return the BitBoard of the position and the legal moves of a color on it by origin square.
+
+            Both are built once per position and color, so the pieces of a position share one BitBoard.
+
+        '''
+        cache = self.bitboard_cache
+        if cache is None or cache[0] != self.key or cache[1] != color:
+            bb = BitBoard.from_board(self, color)
+            legal = {}
+            for m in bb.legal_moves():
+                legal.setdefault(m & 63, []).append(m)
+            cache = self.bitboard_cache = (self.key, color, bb, legal)
+        return cache[2], cache[3]
 
     def calc_moves(self, piece, row, col, bool = True):
         '''
             Calculate all the possible (valid) moves of an spcifiv piece on a specific position.
             
         '''
+        for move in self.generate_moves(piece, row, col, bool):
+            piece.add_move(move)
+
+    def generate_moves(self, piece, row, col, bool = True):
+        '''
+            Yield the moves of the piece on (row, col) one at a time, only the legal ones if bool is set.
+
+            Nothing is stored on the piece, and the board is the same before and after every move yielded.
+
+        '''
+        if bool and self.use_bitboard:
+            bb, legal = self.bitboard_moves(piece.color)
+            for m in legal.get(row * 8 + col, ()):
+                yield bb.to_board_move(self, m)
+            return
+
+        #all moves of the piece share the square it starts from
+        initial = Square(row, col)
+
         def pawn_moves():
             if piece.moved:
                 steps = 1
             else:
                 steps = 2
 
+            def add_pawn_move(initial, final):
+                #a pawn reaching the last row promotes, one move per promotion piece
+                if final.row == 0 or final.row == 7:
+                    moves = [Move(initial, final, promotion) for promotion in Move.PROMOTIONS]
+                else:
+                    moves = [Move(initial, final)]
+                #check checks
+                if bool and self.in_check(piece, moves[0]):
+                    return
+                for move in moves:
+                    yield move
+
             #vertical move
             start = row + piece.dir
             end = row + (piece.dir * (1+steps))
             for possible_move_row in range(start, end, piece.dir):
                 if Square.in_range(possible_move_row):
                     if self.squares[possible_move_row][col].isempty():
-                        #create initial and final move squares
-                        initial = Square(row, col)
+                        #create final move square
                         final = Square(possible_move_row, col)
                         #create new move
-                        move = Move(initial, final)
-                        #check checks
-                        if bool:
-                            if not self.in_check(piece, move):
-                                piece.add_move(move)
-                        else:
-                            piece.add_move(move)
+                        yield from add_pawn_move(initial, final)
                     else:
                         break #we are blocked
                 else:
                     break
 
-                #diagonal move
-                possible_move_row = row + piece.dir
-                possible_move_cols = [col-1, col+1]
-                for possible_move_col in possible_move_cols:
-                    if Square.in_range(possible_move_row, possible_move_col):
-                        if self.squares[possible_move_row][possible_move_col].has_enemy_piece(piece.color):
-                            #create initial and final move squares
-                            initial = Square(row, col)
-                            final_piece = self.squares[possible_move_row][possible_move_col].piece
-                            final = Square(possible_move_row, possible_move_col, final_piece)
+            #diagonal move
+            possible_move_row = row + piece.dir
+            possible_move_cols = [col-1, col+1]
+            for possible_move_col in possible_move_cols:
+                if Square.in_range(possible_move_row, possible_move_col):
+                    if self.squares[possible_move_row][possible_move_col].has_enemy_piece(piece.color):
+                        #create final move square
+                        final_piece = self.squares[possible_move_row][possible_move_col].piece
+                        final = Square(possible_move_row, possible_move_col, final_piece)
+                        #create new move
+                        yield from add_pawn_move(initial, final)
+
+            #en passant moves
+            if piece.color == 'white':
+                r = 3
+            else:
+                r = 4
+            if piece.color == 'white':
+                fr = 2
+            else:
+                fr = 5
+            #left en passant
+            if Square.in_range(col-1) and row == r:
+                if self.squares[row][col-1].has_enemy_piece(piece.color):
+                    p = self.squares[row][col-1].piece
+                    if isinstance(p, Pawn):
+                        if p.en_passant:
+                            #create final move square
+                            final = Square(fr,col-1, p)
                             #create new move
                             move = Move(initial, final)
                             if bool:
                                 if not self.in_check(piece, move):
-                                    piece.add_move(move)
+                                    yield move
                             else:
-                                piece.add_move(move)
-                            
-                #en passant moves
-                if piece.color == 'white':
-                    r = 3
-                else:
-                    r = 4
-                if piece.color == 'white':
-                    fr = 2
-                else:
-                    fr = 5
-                #left en passant
-                if Square.in_range(col-1) and row == r:
-                    if self.squares[row][col-1].has_enemy_piece(piece.color):
-                        p = self.squares[row][col-1].piece
-                        if isinstance(p, Pawn):
-                            if p.en_passant:
-                                #create initial and final move squares
-                                initial = Square(row, col)
-                                final = Square(fr,col-1, p)
-                                #create new move
-                                move = Move(initial, final)
-                                if bool:
-                                    if not self.in_check(piece, move):
-                                        piece.add_move(move)
-                                else:
-                                    piece.add_move(move)
-
-               
-                #right en passant
-                if Square.in_range(col+1) and row == r:
-                    if self.squares[row][col+1].has_enemy_piece(piece.color):
-                        p = self.squares[row][col+1].piece
-                        if isinstance(p, Pawn):
-                            if p.en_passant:
-                                #create initial and final move squares
-                                initial = Square(row, col)
-                                final = Square(fr, col+1, p)
-                                #create new move
-                                move = Move(initial, final)
-                                if bool:
-                                    if not self.in_check(piece, move):
-                                        piece.add_move(move)
-                                else:
-                                    piece.add_move(move)
-
-
-
-
+                                yield move
+
+            #right en passant
+            if Square.in_range(col+1) and row == r:
+                if self.squares[row][col+1].has_enemy_piece(piece.color):
+                    p = self.squares[row][col+1].piece
+                    if isinstance(p, Pawn):
+                        if p.en_passant:
+                            #create final move square
+                            final = Square(fr, col+1, p)
+                            #create new move
+                            move = Move(initial, final)
+                            if bool:
+                                if not self.in_check(piece, move):
+                                    yield move
+                            else:
+                                yield move
 
         def knight_moves():
         
@@ -245,19 +689,16 @@ class Board:
 
                 if Square.in_range(possible_move_row, possible_move_col):
                     if self.squares[possible_move_row][possible_move_col].isempty_or_enemy(piece.color):
-                        #create squares of new move
-                        initial = Square(row, col)
+                        #create final square of new move
                         final_piece = self.squares[possible_move_row][possible_move_col].piece
                         final = Square(possible_move_row, possible_move_col, final_piece) 
                         #create new move
                         move = Move(initial, final)
                         if bool:
                             if not self.in_check(piece, move):
-                                piece.add_move(move)
-                            else:
-                                break
+                                yield move
                         else:
-                            piece.add_move(move)
+                            yield move
 
         def straightline_moves(incrs):
             for incr in incrs:
@@ -270,33 +711,28 @@ class Board:
 
                 while True:
                     if Square.in_range(possible_move_row, possible_move_col):
-                        # create squares of the possible new move
-                        initial = Square(row, col)
                         final_piece = self.squares[possible_move_row][possible_move_col].piece
-                        final = Square(possible_move_row, possible_move_col, final_piece)
+                        # has team piece = break, before creating a move for it
+                        if final_piece is not None and final_piece.color == piece.color:
+                            break
                         # create a possible new move
-                        move = Move(initial, final)
+                        move = Move(initial, Square(possible_move_row, possible_move_col, final_piece))
 
                         # empty = continue looping
-                        if self.squares[possible_move_row][possible_move_col].isempty():
+                        if final_piece is None:
                             if bool:
                                 if not self.in_check(piece, move):
-                                    piece.add_move(move)
+                                    yield move
                             else:
-                                piece.add_move(move)
+                                yield move
                             
-                        elif self.squares[possible_move_row][possible_move_col].has_enemy_piece(piece.color):
-                          
+                        # enemy piece = capture and break
+                        else:
                             if bool:
                                 if not self.in_check(piece, move):
-                                    piece.add_move(move)
+                                    yield move
                             else:
-                                piece.add_move(move)
-                            break
-                            
-
-                        # has team piece = break
-                        elif self.squares[possible_move_row][possible_move_col].has_team_piece(piece.color):
+                                yield move
                             break
                     
                     # not in range
@@ -321,91 +757,68 @@ class Board:
 
                 if Square.in_range(possible_move_row, possible_move_col):
                     if self.squares[possible_move_row][possible_move_col].isempty_or_enemy(piece.color):
-                        #create squares of new move
-                        initial = Square(row, col)
-                        final = Square(possible_move_row, possible_move_col) #piece = piece
+                        #create final square of new move
+                        final_piece = self.squares[possible_move_row][possible_move_col].piece
+                        final = Square(possible_move_row, possible_move_col, final_piece)
                         #create new move
                         move = Move(initial, final)
                         if bool:
                             if not self.in_check(piece, move):
-                                piece.add_move(move)
-                            else:
-                                break
+                                yield move
                         else:
-                            piece.add_move(move)
+                            yield move
 
-            #castling moves
-            if not piece.moved:
+            #castling moves, never out of or through check
+            enemy = 'black' if piece.color == 'white' else 'white'
+            if not piece.moved and not (bool and self.is_square_attacked(row, col, enemy)):
                 #queen castling
                 left_rook = self.squares[row][0].piece
-                if isinstance(left_rook, Rook):
+                if isinstance(left_rook, Rook) and left_rook.color == piece.color:
                     if not left_rook.moved:
                         for c in range(1, 4):
                             if self.squares[row][c].has_piece():
                                 break
 
                             if c ==3:
-                                #adds keft rook to king
-                                piece.left_rook = left_rook
-
-                                #rook move
-                                initial = Square(row, 0)
-                                final = Square(row, 3)
-                                moveR = Move(initial, final)
-                                
-
                                 #king move
-                                initial = Square(row, col)
                                 final = Square(row, 2)
                                 moveK = Move(initial, final)
                                 
                                 if bool:
-                                    if not self.in_check(piece, moveK) and not self.in_check(left_rook, moveR):
-                                        left_rook.add_move(moveR)
-                                        piece.add_move(moveK)
+                                    #the king may not pass an attacked square
+                                    if not self.is_square_attacked(row, (col + final.col) // 2, enemy) and not self.in_check(piece, moveK):
+                                        yield moveK
                                 else:
-                                    left_rook.add_move(moveR)
-                                    piece.add_move(moveK)
+                                    yield moveK
 
                 #king castling
                 right_rook = self.squares[row][7].piece
-                if isinstance(left_rook, Rook):
-                    if not left_rook.moved:
+                if isinstance(right_rook, Rook) and right_rook.color == piece.color:
+                    if not right_rook.moved:
                         for c in range(5, 7):
                             if self.squares[row][c].has_piece():
                                 break
 
                             if c == 6:
-                                #adds right rook to king
-                                piece.right_rook = right_rook
-
-                                #rook move
-                                initial = Square(row, 7)
-                                final = Square(row, 5)
-                                moveR = Move(initial, final)
-                                
-
                                 #king move
-                                initial = Square(row, col)
                                 final = Square(row, 6)
                                 moveK = Move(initial, final)
                                 if bool:
-                                    if not self.in_check(piece, moveK) and not self.in_check(right_rook, moveR):
-                                        right_rook.add_move(moveR)
-                                        piece.add_move(moveK)
+                                    #the king may not pass an attacked square
+                                    if not self.is_square_attacked(row, (col + final.col) // 2, enemy) and not self.in_check(piece, moveK):
+                                        yield moveK
                                 else:
-                                    right_rook.add_move(moveR)
-                                    piece.add_move(moveK) 
+                                    yield moveK
 
 
         if isinstance(piece, Pawn):
-            pawn_moves()
+            yield from pawn_moves()
 
         elif isinstance(piece, Knight):
-            knight_moves()
+            yield from knight_moves()
 
         elif isinstance(piece, Bishop):
-            straightline_moves([
+            yield from straightline_moves([
                 (-1,1),
                 (-1,-1),
                 (1,1),
@@ -413,7 +826,7 @@ class Board:
             ])
 
         elif isinstance(piece, Rook):
-            straightline_moves([
+            yield from straightline_moves([
                 (-1,0),
                 (0,1),
                 (1,0),
@@ -421,7 +834,7 @@ class Board:
             ])
 
         elif isinstance(piece, Queen):
-            straightline_moves([
+            yield from straightline_moves([
                 (-1,1),
                 (-1,-1),
                 (1,1),
@@ -433,7 +846,7 @@ class Board:
             ])
 
         elif isinstance(piece, King):
-            king_moves()
+            yield from king_moves()
         
     def _create(self):
         for row in range(ROWS):
@@ -2,6 +2,7 @@ import pygame
 import os
 from sound import Sound
 from theme import Theme
+from textures import Textures
 
 class Config:
 
@@ -13,11 +14,14 @@ class Config:
         self.font = pygame.font.SysFont('monospace', 18, bold=True)
         self.move_sound = Sound(os.path.join('assets/sounds/move.wav'))
         self.capture_sound = Sound(os.path.join('assets/sounds/siuuu.mp3'))
+        self.textures = Textures()
 
     def change_theme(self):
         self.idx += 1
         self.idx %= len(self.themes)
         self.theme = self.themes[self.idx]
+        #start a fresh texture cache with the new theme
+        self.textures = Textures()
 
     def _add_themes(self):
         green = Theme((234, 235, 200), (119,154,88), (244, 247, 116), (172, 195, 51), '#C86464', '#C84646')
@@ -5,4 +5,7 @@ HEIGHT = 800
 #Board dimensions
 ROWS = 8
 COLS = 8
-SQSIZE = WIDTH // COLS
\ No newline at end of file
+SQSIZE = WIDTH // COLS
+
+#Frame rate cap
+FPS = 60
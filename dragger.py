@@ -14,7 +14,7 @@ class Dragger:
         initial_col: The initial column index of the piece being dragged.
 
     Methods:
-        update_blit(surface): Updates the display surface with the dragged piece.
+        update_blit(surface, textures): Updates the display surface with the dragged piece.
         update_mouse(pos): Updates the mouse coordinates.
         save_initial(pos): Saves the initial position of the piece being dragged.
         drag_piece(piece): Sets the piece to be dragged.
@@ -31,13 +31,10 @@ class Dragger:
 
     #blit methods
 
-    def update_blit(self, surface):
+    def update_blit(self, surface, textures):
 
-        #texture
-        self.piece.set_texture(size=128)
-        texture = self.piece.texture
         #img
-        img = pygame.image.load(texture)
+        img = textures.get(self.piece, size=128)
         #rect
         img_center = (self.mouseX, self.mouseY)
         self.piece.texture_rect = img.get_rect(center=img_center)
@@ -0,0 +1,577 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from const import *
+from piece import *
+
+INFINITY = 1000000
+MATE = 100000
+#scores beyond this are mates, counted in plies from the root
+MATE_BOUND = MATE - 1000
+
+#transposition table bounds
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+#centipawn bonus of a square for a white piece, row 0 is the eighth rank; black reads the rows mirrored
+PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+TABLES = {'pawn': PAWN_TABLE, 'knight': KNIGHT_TABLE, 'bishop': BISHOP_TABLE, 'king': KING_TABLE}
+
+
+class SearchStopped(Exception):
+    pass
+
+
+def move_id(move):
+    '''
+        Identify a move by its squares and promotion, the same for every Move object of that move.
+
+    '''
+    return (move.initial.row, move.initial.col, move.final.row, move.final.col, move.promotion)
+
+
+def evaluate(board):
+    '''
+        Score the position in centipawns from the point of view of the next player: material from Piece.value plus square bonuses.
+
+    '''
+    score = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board.squares[row][col].piece
+            if piece is None:
+                continue
+            if isinstance(piece, King):
+                value = 0
+            else:
+                value = int(piece.value * 100)
+            table = TABLES.get(piece.name)
+            if table is not None:
+                if piece.color == 'white':
+                    value += table[row * 8 + col]
+                else:
+                    value -= table[(7 - row) * 8 + col]
+            score += value
+    return score if board.next_player == 'white' else -score
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results, indexed by the Zobrist key of the position.
+
+    Attributes:
+        size (int): The number of entries.
+        entries (list): (key, depth, score, bound, move id) tuples, None for empty slots.
+
+    Methods:
+        get(key): Returns the entry of a position or None.
+        put(key, depth, score, bound, move): Stores a search result, replacing shallower results in the slot.
+        clear(): Empties the table.
+    """
+    def __init__(self, size=1 << 18):
+        self.size = size
+        self.entries = [None] * size
+
+    def get(self, key):
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key, depth, score, bound, move):
+        index = key % self.size
+        old = self.entries[index]
+        if old is None or old[0] != key or depth >= old[1]:
+            self.entries[index] = (key, depth, score, bound, move)
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+
+class Engine:
+    """
+    Negamax alpha-beta search on Board with iterative deepening.
+
+    Attributes:
+        tt (TranspositionTable): Search results shared between iterations and searches.
+        killers (list): Two quiet moves per ply that caused a beta cutoff.
+        history (dict): Cutoff counts of quiet moves, by color and move.
+        nodes (int): The nodes searched by the current search.
+
+    Methods:
+        search(board, depth=None, movetime=None, nodes=None, info=None): Finds the best move of the next player.
+        search_root(board, root_moves, depth, alpha, movetime=None, nodes=None): Searches some root moves to a fixed depth.
+        stop(): Asks a running search to return as soon as possible.
+    """
+
+    MAX_DEPTH = 64
+    #budget when search() gets neither a depth, a movetime nor nodes
+    DEFAULT_MOVETIME = 1000
+
+    def __init__(self, tt_size=1 << 18):
+        self.tt = TranspositionTable(tt_size)
+        self.killers = [[None, None] for ply in range(self.MAX_DEPTH + 1)]
+        self.history = {}
+        self.nodes = 0
+        self.stopped = False
+        self.deadline = None
+        self.max_nodes = None
+        self.path = []
+
+    def stop(self):
+        self.stopped = True
+
+    def search(self, board, depth=None, movetime=None, nodes=None, info=None):
+        '''
+            Search the position of board, which is left unchanged, and return the best (piece, move) and its score.
+
+            depth limits the iterations, movetime (milliseconds) and nodes the work; info(depth, score, nodes, seconds, move)
+            is called after every finished iteration.
+
+        '''
+        if depth is None and movetime is None and nodes is None:
+            movetime = self.DEFAULT_MOVETIME
+        start = self._start(movetime, nodes)
+
+        moves = board.legal_moves()
+        if not moves:
+            #mated or stalemated at the root, scored like _negamax does at ply 0
+            return None, -MATE if board.king_attacked(board.next_player) else 0
+        best = moves[0]
+        best_score = -INFINITY
+
+        for d in range(1, min(depth or self.MAX_DEPTH, self.MAX_DEPTH) + 1):
+            try:
+                score, move = self._root(board, moves, d)
+            except SearchStopped:
+                break
+            best, best_score = move, score
+            elapsed = time.perf_counter() - start
+            if info is not None:
+                info(d, score, self.nodes, elapsed, best[1])
+            if abs(score) >= MATE_BOUND:
+                break
+            #another iteration takes several times longer than this one, do not start what cannot finish
+            if self.deadline is not None and time.perf_counter() + elapsed > self.deadline:
+                break
+
+        return best, best_score
+
+    def search_root(self, board, root_moves, depth, alpha=-INFINITY, movetime=None, nodes=None):
+        '''
+            Search the root moves with these move ids to a fixed depth, with alpha as the score to beat.
+
+            Return the best score and move id, (alpha, None) if no move beats alpha, or None if the budget ran out.
+
+        '''
+        self._start(movetime, nodes)
+        legal = board.legal_moves()
+        moves = [(piece, move) for piece, move in legal if move_id(move) in root_moves]
+        #with only some of the moves or a raised alpha the score is only a lower bound of the position
+        bound = EXACT if len(moves) == len(legal) and alpha == -INFINITY else LOWER
+        try:
+            score, best = self._root(board, moves, depth, alpha, bound)
+        except SearchStopped:
+            return None
+        return score, move_id(best[1]) if best else None
+
+    def _start(self, movetime, nodes):
+        start = time.perf_counter()
+        self.deadline = start + movetime / 1000 if movetime is not None else None
+        self.max_nodes = nodes
+        self.nodes = 0
+        self.stopped = False
+        self.path = []
+        self.killers = [[None, None] for ply in range(self.MAX_DEPTH + 1)]
+        for k in self.history:
+            self.history[k] //= 2
+        return start
+
+    def _tick(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchStopped()
+        #a node costs far more than reading the clock, so look at every node and keep movetime even at a few knps
+        if self.stopped or (self.deadline is not None and time.perf_counter() > self.deadline):
+            raise SearchStopped()
+
+    def _root(self, board, moves, depth, alpha=-INFINITY, bound=EXACT):
+        entry = self.tt.get(board.key)
+        ordered = self._order(moves, entry[4] if entry else None, 0, board.next_player)
+        best = None
+        self.path.append(board.key)
+        try:
+            for piece, move in ordered:
+                undo = board.make_move(piece, move)
+                try:
+                    score = -self._negamax(board, depth - 1, -INFINITY, -alpha, 1)
+                finally:
+                    board.unmake_move(undo)
+                if score > alpha:
+                    alpha = score
+                    best = (piece, move)
+        finally:
+            self.path.pop()
+        if best is not None:
+            self.tt.put(board.key, depth, alpha, bound, move_id(best[1]))
+        return alpha, best
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        key = board.key
+        #a repeated position is a draw
+        if key in self.path:
+            return 0
+        #leaves are counted by _quiesce
+        if depth <= 0:
+            return self._quiesce(board, alpha, beta, ply)
+        self._tick()
+
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = self._from_tt(entry[2], ply)
+                bound = entry[3]
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score > alpha:
+                    alpha = score
+                elif bound == UPPER and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+
+        color = board.next_player
+        moves = board.legal_moves(color)
+        if not moves:
+            return -MATE + ply if board.king_attacked(color) else 0
+
+        alpha_orig = alpha
+        best_score = -INFINITY
+        best_move = None
+        self.path.append(key)
+        try:
+            for piece, move in self._order(moves, tt_move, ply, color):
+                undo = board.make_move(piece, move)
+                try:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+                finally:
+                    board.unmake_move(undo)
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    if move.final.piece is None and move.promotion is None:
+                        self._store_killer(move, ply, color, depth)
+                    break
+        finally:
+            self.path.pop()
+
+        if best_score <= alpha_orig:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.put(key, depth, self._to_tt(best_score, ply), bound, move_id(best_move))
+        return best_score
+
+    def _quiesce(self, board, alpha, beta, ply):
+        '''
+            Search captures and queen promotions only, until the position is quiet.
+
+        '''
+        self._tick()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        color = board.next_player
+        captures = [(piece, move) for piece, move in board.legal_moves(color)
+                    if move.final.piece is not None or move.promotion == 'queen']
+        for piece, move in self._order(captures, None, ply, color):
+            undo = board.make_move(piece, move)
+            try:
+                score = -self._quiesce(board, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(undo)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _order(self, moves, tt_move, ply, color):
+        '''
+            Sort moves best first: the table move, captures by most valuable victim and least valuable attacker,
+            promotions, killers, then quiet moves by history.
+
+        '''
+        killers = self.killers[ply] if ply <= self.MAX_DEPTH else (None, None)
+        history = self.history
+
+        def score(item):
+            piece, move = item
+            mid = move_id(move)
+            if mid == tt_move:
+                return 1 << 30
+            victim = move.final.piece
+            if victim is not None:
+                return (1 << 20) + int(abs(victim.value) * 100) * 16 - min(int(abs(piece.value)), 15)
+            if move.promotion is not None:
+                return (1 << 19) + (move.promotion == 'queen')
+            if mid == killers[0]:
+                return (1 << 18) + 1
+            if mid == killers[1]:
+                return 1 << 18
+            return history.get((color, mid), 0)
+
+        return sorted(moves, key=score, reverse=True)
+
+    def _store_killer(self, move, ply, color, depth):
+        mid = move_id(move)
+        if ply <= self.MAX_DEPTH:
+            killers = self.killers[ply]
+            if killers[0] != mid:
+                killers[1] = killers[0]
+                killers[0] = mid
+        key = (color, mid)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+    @staticmethod
+    def _to_tt(score, ply):
+        #mate scores are stored relative to the position, not to the root
+        if score >= MATE_BOUND:
+            return score + ply
+        if score <= -MATE_BOUND:
+            return score - ply
+        return score
+
+    @staticmethod
+    def _from_tt(score, ply):
+        if score >= MATE_BOUND:
+            return score - ply
+        if score <= -MATE_BOUND:
+            return score + ply
+        return score
+
+
+#engine of a worker process, kept between tasks so that its table helps the next iteration
+_worker_engine = None
+
+
+def _search_root_moves(board, root_moves, depth, alpha, movetime, nodes, tt_size):
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = Engine(tt_size)
+    result = _worker_engine.search_root(board, root_moves, depth, alpha, movetime, nodes)
+    return result, _worker_engine.nodes
+
+
+class ParallelEngine:
+    """
+    Root splitting search over worker processes, iteration by iteration.
+
+    Every iteration searches the expected best move first in this process, then deals the other root moves out to
+    the workers, which only have to show that their moves are no better (young brothers wait).
+
+    Attributes:
+        workers (int): The number of worker processes.
+        engine (Engine): The engine searching the first root move.
+        nodes (int): The nodes searched by this process and all workers in the last search.
+
+    Methods:
+        search(board, depth=None, movetime=None, nodes=None, info=None): Finds the best move of the next player.
+        close(): Shuts the worker processes down.
+    """
+    def __init__(self, workers=None, tt_size=1 << 18):
+        self.workers = workers or os.cpu_count() or 1
+        self.tt_size = tt_size
+        self.engine = Engine(tt_size)
+        self.nodes = 0
+        self.pool = ProcessPoolExecutor(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def search(self, board, depth=None, movetime=None, nodes=None, info=None):
+        '''
+            Search the position of board and return the best (piece, move) and its score, like Engine.search.
+
+        '''
+        if depth is None and movetime is None and nodes is None:
+            movetime = Engine.DEFAULT_MOVETIME
+        start = time.perf_counter()
+        self.nodes = 0
+        moves = board.legal_moves()
+        if not moves:
+            #mated or stalemated at the root, scored like _negamax does at ply 0
+            return None, -MATE if board.king_attacked(board.next_player) else 0
+        ordered = self.engine._order(moves, None, 0, board.next_player)
+        best, best_score = ordered[0], -INFINITY
+
+        for d in range(1, min(depth or Engine.MAX_DEPTH, Engine.MAX_DEPTH) + 1):
+            remaining_time = movetime - (time.perf_counter() - start) * 1000 if movetime is not None else None
+            remaining_nodes = nodes - self.nodes if nodes is not None else None
+            if (remaining_time is not None and remaining_time <= 0) or (remaining_nodes is not None and remaining_nodes <= 0):
+                break
+
+            #the expected best move sets the score the others have to beat
+            first = move_id(ordered[0][1])
+            result = self.engine.search_root(board, {first}, d, -INFINITY, remaining_time, remaining_nodes)
+            self.nodes += self.engine.nodes
+            if result is None:
+                break
+            score, mid = result
+
+            #deal the other moves round robin, so that every worker gets some of the promising ones
+            rest = ordered[1:]
+            shares = [set() for w in range(min(self.workers, len(rest)))]
+            for i, (piece, move) in enumerate(rest):
+                shares[i % len(shares)].add(move_id(move))
+            worker_nodes = remaining_nodes // len(shares) if remaining_nodes is not None and shares else None
+            worker_time = movetime - (time.perf_counter() - start) * 1000 if movetime is not None else None
+            futures = [self.pool.submit(_search_root_moves, board, share, d, score, worker_time, worker_nodes, self.tt_size)
+                       for share in shares]
+            stopped = False
+            for future in futures:
+                result, searched = future.result()
+                self.nodes += searched
+                if result is None:
+                    stopped = True
+                elif result[1] is not None and result[0] > score:
+                    score, mid = result
+            if stopped:
+                break
+
+            #the new best move goes first in the next iteration
+            ordered.sort(key=lambda item: move_id(item[1]) != mid)
+            best, best_score = ordered[0], score
+            if info is not None:
+                info(d, score, self.nodes, time.perf_counter() - start, best[1])
+            if abs(score) >= MATE_BOUND:
+                break
+
+        return best, best_score
+
+
+def bench(depth, workers):
+    '''
+        Search the perft positions to a fixed depth with one process and with the worker pool, and print the speedup.
+
+        The nodes show the extra work of the split search, the times how much of it the cores absorb.
+
+    '''
+    from perft import POSITIONS, load_fen
+
+    print(f'{os.cpu_count()} cores')
+    single_time = 0.0
+    parallel_time = 0.0
+    with ParallelEngine(workers) as parallel:
+        for name, fen, expected in POSITIONS:
+            board, color = load_fen(fen)
+            engine = Engine()
+            start = time.perf_counter()
+            best, score = engine.search(board, depth)
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            parallel_best, parallel_score = parallel.search(board, depth)
+            multi = time.perf_counter() - start
+
+            single_time += single
+            parallel_time += multi
+            print(f'{name:10} depth {depth}  1 worker {single:7.2f} s {engine.nodes:8} nodes {best[1].uci()} {score:6}  '
+                  f'{workers} workers {multi:7.2f} s {parallel.nodes:8} nodes {parallel_best[1].uci()} {parallel_score:6}  '
+                  f'speedup {single / multi:5.2f}')
+    print(f'{"total":10} depth {depth}  1 worker {single_time:7.2f} s  {workers} workers {parallel_time:7.2f} s  '
+          f'speedup {single_time / parallel_time:5.2f}')
+
+
+def main(argv=None):
+    from perft import load_fen
+
+    parser = argparse.ArgumentParser(description='Search the best move of a position.')
+    parser.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    parser.add_argument('--depth', type=int)
+    parser.add_argument('--movetime', type=int, help='milliseconds per move')
+    parser.add_argument('--nodes', type=int)
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 1 searches in this process')
+    parser.add_argument('--bench', action='store_true', help='compare one worker with --workers on the perft positions')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        bench(args.depth or 3, args.workers)
+        return 0
+
+    board, color = load_fen(args.fen)
+
+    def info(depth, score, nodes, seconds, move):
+        nps = int(nodes / seconds) if seconds else 0
+        print(f'depth {depth} score {score} nodes {nodes} time {int(seconds * 1000)} nps {nps} move {move.uci()}')
+
+    if args.workers > 1:
+        with ParallelEngine(args.workers) as engine:
+            best, score = engine.search(board, args.depth, args.movetime, args.nodes, info)
+    else:
+        best, score = Engine().search(board, args.depth, args.movetime, args.nodes, info)
+    print('bestmove', best[1].uci() if best else '(none)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,68 +1,216 @@
+import argparse
+import csv
 import cv2
-import torch
 import numpy as np
 import os
-from model import NeuralNet, img_processing, label_to_fen, n_in, h1, h2, h3, h4, h5, n_out
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from preprocess import img_processing, img_processing_batch, label_to_fen, fen_to_piece_label, fen_from_filename
 import glob
 
 
 class FENPredictor:
-    def __init__(self, model_path):
+    def __init__(self, model_path, quantized=False, device=None):
         # Laden des trainierten Modells
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = NeuralNet(n_in, h1, h2, h3, h4, h5, n_out).to(self.device)
-        self.model = torch.load(model_path)
+        # quantized: model_path ist das int8 TorchScript-Modell aus model.export_quantized, es läuft nur auf der CPU
+        # .onnx: das Modell aus model.export_onnx läuft mit onnxruntime, ohne torch (und ohne model.py) zu importieren
+        self.session = None
+        if model_path.endswith('.onnx'):
+            import onnxruntime
+            self.device = "cpu"
+            self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+            return
+
+        import torch
+        if quantized:
+            self.device = torch.device("cpu")
+            self.model = torch.jit.load(model_path, map_location=self.device)
+        else:
+            from model import NeuralNet, n_in, h1, h2, h3, h4, h5, n_out
+            self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+            self.model = NeuralNet(n_in, h1, h2, h3, h4, h5, n_out).to(self.device)
+            # model_chess.pth enthält nur die Gewichte (state_dict), siehe model.py
+            self.model.load_state_dict(torch.load(model_path, map_location=self.device, weights_only=True))
         self.model.eval()
     
     def predict_fen(self, image_path):
         # Laden des Bildes und Verarbeiten
-        img = cv2.imread(image_path)
-        img_processed = img_processing(img)
-        img_tensor = torch.FloatTensor(img_processed).to(self.device)
-        
-        # Vorhersage mit dem Modell
-        with torch.no_grad():
-            output = self.model(img_tensor)
-        
-        # Umwandlung der Vorhersage in einen FEN-Code
-        predicted_labels = output.view(len(output), -1).argmax(1).cpu().numpy().astype(np.int32).tolist()
-        predicted_fen = label_to_fen(predicted_labels)
-        
-        return predicted_fen
+        img_processed = img_processing(self.load(image_path))
+
+        # Vorhersage mit dem Modell, Umwandlung der Vorhersage in einen FEN-Code
+        return self.predict_tiles(img_processed[np.newaxis])[0]
+
+    def predict_fens(self, paths_or_arrays, batch_size=64, workers=4):
+        # Vorhersage für viele Bilder: batch_size Bretter pro Forward-Pass, die Bilder des nächsten Batches werden
+        # währenddessen von workers Threads dekodiert (cv2 gibt dabei den GIL frei) und dann in einem Durchgang
+        # mit img_processing_batch verarbeitet.
+        # Liefert die FEN-Codes in der Reihenfolge der Eingabe, sobald ihr Batch fertig ist.
+        items = iter(paths_or_arrays)
+        with ThreadPoolExecutor(workers) as pool:
+            def submit():
+                return deque(pool.submit(self.load, item) for item in islice(items, batch_size))
+
+            pending = submit()
+            while pending:
+                upcoming = submit()
+                tiles = img_processing_batch([future.result() for future in pending])
+                for fen in self.predict_tiles(tiles):
+                    yield fen
+                pending = upcoming
+
+    @staticmethod
+    def load(image):
+        # Dateipfad zu BGR-Bild, bereits geladene Bilder bleiben wie sie sind
+        if isinstance(image, (str, os.PathLike)):
+            path = image
+            image = cv2.imread(os.fspath(path))
+            if image is None:
+                raise ValueError(f"cannot read image {path}")
+        return image
+
+    def predict_tiles(self, tiles):
+        # N x 64 x 625 Kacheln in einem Forward-Pass zu N FEN-Codes
+        if self.session is not None:
+            x = tiles.reshape(-1, tiles.shape[-1]).astype(np.float32)
+            output = self.session.run(None, {'tiles': x})[0]
+            labels = output.argmax(1).reshape(len(tiles), 64).astype(np.int32)
+        else:
+            import torch
+            x = torch.from_numpy(np.ascontiguousarray(tiles)).to(self.device).view(-1, tiles.shape[-1]).float()
+            with torch.no_grad():
+                output = self.model(x)
+            labels = output.view(len(output), -1).argmax(1).view(len(tiles), 64).cpu().numpy().astype(np.int32)
+        return [label_to_fen(board.tolist()) for board in labels]
+
+def compare_quantized(model_path, quantized_path, image_paths, batch_size=64, limit=2000):
+    # Latenz und Genauigkeit des int8-Modells gegenüber dem float-Modell, beide auf der CPU, auf Bildern deren
+    # Dateiname der richtige FEN-Code ist (z.B. dem Testset). Die Bilder werden einmal dekodiert, gemessen wird
+    # nur das Modell.
+    image_paths = image_paths[:limit]
+    tiles = np.concatenate([img_processing_batch([FENPredictor.load(path) for path in image_paths[i:i + batch_size]])
+                            for i in range(0, len(image_paths), batch_size)])
+    actual = [fen_from_filename(path) for path in image_paths]
+    actual_labels = np.array([fen_to_piece_label(fen) for fen in actual])
+
+    results = {}
+    for name, predictor in (('float', FENPredictor(model_path, device="cpu")),
+                            ('int8', FENPredictor(quantized_path, quantized=True))):
+        start = time.perf_counter()
+        fens = []
+        for i in range(0, len(tiles), batch_size):
+            fens.extend(predictor.predict_tiles(tiles[i:i + batch_size]))
+        seconds = time.perf_counter() - start
+        labels = np.array([fen_to_piece_label(fen) for fen in fens])
+        results[name] = (seconds * 1000 / len(tiles),
+                         np.mean(labels == actual_labels),
+                         np.mean([fen == fen_actual for fen, fen_actual in zip(fens, actual)]))
+        print(f"{name:6} {results[name][0]:.3f} ms/board  label accuracy {results[name][1]:.4f}  "
+              f"FEN accuracy {results[name][2]:.4f}")
+
+    latency, label_accuracy, fen_accuracy = (q - f for q, f in zip(results['int8'], results['float']))
+    print(f"delta  {latency:+.3f} ms/board ({results['int8'][0] / results['float'][0]:.2f}x)  "
+          f"label accuracy {label_accuracy:+.4f}  FEN accuracy {fen_accuracy:+.4f}")
+    return results
+
+def normalize_fen(fen):
+    # Nur die Stellung, Reihen mit '/' getrennt: model.label_to_fen trennt mit '-', die CSV enthält ganze FEN-Codes
+    return fen.split()[0].replace('-', '/')
+
+
+class EvaluationIndex:
+    # SQLite-Index über die Bewertungs-CSV (Spalten FEN, Evaluation, Move), nach normalisierter Stellung.
+    # Er wird beim ersten Gebrauch neben der CSV angelegt und nur neu gebaut, wenn die CSV neuer ist; danach kostet
+    # eine Abfrage einen Index-Zugriff statt die CSV neu zu lesen.
+    def __init__(self, csv_file_path, index_path=None):
+        self.csv_file_path = csv_file_path
+        self.index_path = index_path or csv_file_path + '.sqlite'
+        if (not os.path.exists(self.index_path)
+                or os.path.getmtime(self.index_path) < os.path.getmtime(csv_file_path)):
+            self.build()
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+
+    def build(self):
+        # in eine temporäre Datei schreiben, damit ein abgebrochener Aufbau keinen halben Index hinterlässt
+        temp_path = self.index_path + '.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        connection = sqlite3.connect(temp_path)
+        connection.execute('CREATE TABLE evals (fen TEXT, evaluation TEXT, move TEXT)')
+        with open(self.csv_file_path, newline='') as f:
+            rows = ((normalize_fen(row['FEN']), row['Evaluation'], row['Move']) for row in csv.DictReader(f))
+            connection.executemany('INSERT INTO evals VALUES (?, ?, ?)', rows)
+        # der Index erst nach dem Einfügen, das ist schneller als ihn bei jeder Zeile nachzuführen
+        connection.execute('CREATE INDEX evals_fen ON evals (fen)')
+        connection.commit()
+        connection.close()
+        os.replace(temp_path, self.index_path)
+
+    def lookup(self, fens):
+        # Bewertungen und beste Züge aller Zeilen, deren Stellung einer der fens ist
+        evaluations = []
+        moves = []
+        for fen in fens:
+            for evaluation, move in self.connection.execute('SELECT evaluation, move FROM evals WHERE fen = ?',
+                                                            (normalize_fen(fen),)):
+                evaluations.append(evaluation)
+                moves.append(move)
+        return evaluations, moves
+
+
+_indexes = {}
+
+def compare_with_csv(predicted_fen, csv_file_path):
+    # Durchführung des Abgleichs, über den einmal pro CSV geöffneten Index
+    if csv_file_path not in _indexes:
+        _indexes[csv_file_path] = EvaluationIndex(csv_file_path)
+    return _indexes[csv_file_path].lookup(predicted_fen)
 
 # Verwendung der Klasse
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recognize the FEN code of board images.')
+    parser.add_argument('--int8', action='store_true', help='use the quantized model_chess_int8.pt on the CPU')
+    parser.add_argument('--onnx', action='store_true', help='use model_chess.onnx with onnxruntime instead of torch')
+    parser.add_argument('--compare', action='store_true',
+                        help='compare latency and accuracy of the int8 and the float model on the test set')
+    args = parser.parse_args()
+
     model_path = 'model_chess.pth'
-    predictor = FENPredictor(model_path)
+    quantized_path = 'model_chess_int8.pt'
+    if args.compare:
+        compare_quantized(model_path, quantized_path,
+                          glob.glob(r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess\test\*.jpeg"))
+        raise SystemExit
+
+    if args.onnx:
+        predictor = FENPredictor('model_chess.onnx')
+    elif args.int8:
+        predictor = FENPredictor(quantized_path, quantized=True)
+    else:
+        predictor = FENPredictor(model_path)
     
     # Dateipfad zum Ordner mit Bildern
     image_folder_path = glob.glob(r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess\fen\*.jpeg")
     
-    # Vorhersage des FEN-Codes für jedes Bild im Ordner
-    for image_path in image_folder_path:
-        predicted_fen = predictor.predict_fen(image_path)
+    # Vorhersage des FEN-Codes für jedes Bild im Ordner, in Batches
+    start = time.perf_counter()
+    predicted_fen_list = []
+    for image_path, predicted_fen in zip(image_folder_path, predictor.predict_fens(image_folder_path)):
         print(f"Predicted FEN Code for {image_path}: {predicted_fen}")
+        predicted_fen_list.append(predicted_fen)
+    seconds = time.perf_counter() - start
+    print(f"{len(image_folder_path)} images in {seconds:.1f} s, {len(image_folder_path) / seconds:.1f} images/s")
 
-import pandas as pd
-def compare_with_csv(predicted_fen, csv_file_path):
-    
-    df = pd.read_csv(csv_file_path)
-    
-    # Durchführung des Abgleichs
-    matching_rows = df[df['FEN'].isin(predicted_fen)]
-    
-    return matching_rows['Evaluation'].tolist(), matching_rows['Move'].tolist()
-
-
-
-# Verwendung der Funktion
-csv_file_path = glob.glob(r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess Data\tactic_evals.csv")[0]
-predicted_fen_list = [predicted_fen]  # FEN-Code in eine Liste einbetten
-evaluations, best_moves = compare_with_csv(predicted_fen_list, csv_file_path)
-print(predicted_fen_list)
-
+    # Verwendung der Funktion
+    csv_file_path = r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess Data\tactic_evals.csv"
+    if os.path.exists(csv_file_path):
+        for predicted_fen in predicted_fen_list:
+            evaluations, best_moves = compare_with_csv([predicted_fen], csv_file_path)
 
-# Ergebnisse anzeigen
-for evaluation, best_move in zip(evaluations, best_moves):
-    print("Evaluation:", evaluation)
-    print("Best Move:", best_move)
+            # Ergebnisse anzeigen
+            print(predicted_fen)
+            for evaluation, best_move in zip(evaluations, best_moves):
+                print("Evaluation:", evaluation)
+                print("Best Move:", best_move)
@@ -0,0 +1,58 @@
+import time
+from collections import deque
+
+class FrameTimer:
+    """
+    Measures how long the frames take to draw.
+
+    Attributes:
+        times (deque): The durations of the last frames in seconds.
+        frames (int): The number of frames measured so far.
+        busy (float): The seconds spent in frames since the last report.
+
+    Methods:
+        start(): Marks the start of a frame.
+        stop(): Marks the end of a frame and records its duration.
+        cancel(): Drops the frame started last, for wake ups that draw nothing.
+        average_ms(): Returns the average frame time in milliseconds.
+        max_ms(): Returns the longest frame time in milliseconds.
+        load(): Returns the share of time spent in frames since the last call.
+    """
+    def __init__(self, window = 120):
+        self.times = deque(maxlen=window)
+        self.frames = 0
+        self.busy = 0.0
+        self._start = None
+        self._period = time.perf_counter()
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._start is not None:
+            duration = time.perf_counter() - self._start
+            self.times.append(duration)
+            self.busy += duration
+            self.frames += 1
+            self._start = None
+
+    def cancel(self):
+        self._start = None
+
+    def average_ms(self):
+        if not self.times:
+            return 0.0
+        return sum(self.times) / len(self.times) * 1000
+
+    def max_ms(self):
+        if not self.times:
+            return 0.0
+        return max(self.times) * 1000
+
+    def load(self):
+        now = time.perf_counter()
+        elapsed = now - self._period
+        load = self.busy / elapsed if elapsed > 0 else 0.0
+        self.busy = 0.0
+        self._period = now
+        return load
@@ -17,6 +17,7 @@ class Game:
         board (Board): The game board.
         dragger (Dragger): The dragger object handling piece dragging functionality.
         config (Config): The configuration object containing game settings and theme.
+        bg_surface (pygame.Surface): The board squares and coordinates of the current theme, drawn once per theme.
     """
 
 
@@ -26,10 +27,57 @@ class Game:
         self.board = Board()
         self.dragger = Dragger()
         self.config = Config()
+        self.bg_surface = self._render_bg()
 
     # blit methods
-
-    def show_bg(self, surface):
+    # each show method draws the whole board, or only the (row, col) squares in squares
+
+    def render(self, surface, squares=None):
+        '''
+            Draw the board, or only the given squares, and return the rects that changed.
+
+        '''
+        self.show_bg(surface, squares)
+        self.show_last_move(surface, squares)
+        self.show_moves(surface, squares)
+        self.show_pieces(surface, squares)
+        self.show_hover(surface, squares)
+
+        if squares is None:
+            return [pygame.Rect(0, 0, WIDTH, HEIGHT)]
+        return [pygame.Rect(col * SQSIZE, row * SQSIZE, SQSIZE, SQSIZE) for row, col in squares]
+
+    @staticmethod
+    def all_squares():
+        return {(row, col) for row in range(ROWS) for col in range(COLS)}
+
+    @staticmethod
+    def squares_in_rect(rect):
+        '''
+            Return the (row, col) squares a rect overlaps.
+
+        '''
+        if rect is None:
+            return set()
+        first_col, last_col = max(rect.left // SQSIZE, 0), min((rect.right - 1) // SQSIZE, COLS - 1)
+        first_row, last_row = max(rect.top // SQSIZE, 0), min((rect.bottom - 1) // SQSIZE, ROWS - 1)
+        return {(row, col) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)}
+
+    def show_bg(self, surface, squares=None):
+        if squares is None:
+            surface.blit(self.bg_surface, (0, 0))
+            return
+
+        for row, col in squares:
+            rect = (col * SQSIZE, row * SQSIZE, SQSIZE, SQSIZE)
+            surface.blit(self.bg_surface, rect, rect)
+
+    def _render_bg(self):
+        '''
+            Draw the squares and coordinate labels of the current theme once, into a surface show_bg copies from.
+
+        '''
+        surface = pygame.Surface((WIDTH, HEIGHT)).convert()
         theme = self.config.theme
         
         for row in range(ROWS):
@@ -61,22 +109,22 @@ class Game:
                     # blit
                     surface.blit(lbl, lbl_pos)
 
-    def show_pieces(self, surface):
-        for row in range(ROWS):
-            for col in range(COLS):
-                # piece ?
-                if self.board.squares[row][col].has_piece():
-                    piece = self.board.squares[row][col].piece
-                    
-                    # all pieces except dragger piece
-                    if piece is not self.dragger.piece:
-                        piece.set_texture(size=80)
-                        img = pygame.image.load(piece.texture)
-                        img_center = col * SQSIZE + SQSIZE // 2, row * SQSIZE + SQSIZE // 2
-                        piece.texture_rect = img.get_rect(center=img_center)
-                        surface.blit(img, piece.texture_rect)
-
-    def show_moves(self, surface):
+        return surface
+
+    def show_pieces(self, surface, squares=None):
+        for row, col in (self.all_squares() if squares is None else squares):
+            # piece ?
+            if self.board.squares[row][col].has_piece():
+                piece = self.board.squares[row][col].piece
+
+                # all pieces except dragger piece
+                if piece is not self.dragger.piece:
+                    img = self.config.textures.get(piece, size=80)
+                    img_center = col * SQSIZE + SQSIZE // 2, row * SQSIZE + SQSIZE // 2
+                    piece.texture_rect = img.get_rect(center=img_center)
+                    surface.blit(img, piece.texture_rect)
+
+    def show_moves(self, surface, squares=None):
         theme = self.config.theme
 
         if self.dragger.dragging:
@@ -84,6 +132,8 @@ class Game:
 
             # loop all valid moves
             for move in piece.moves:
+                if squares is not None and (move.final.row, move.final.col) not in squares:
+                    continue
                 # color
                 color = theme.moves.light if (move.final.row + move.final.col) % 2 == 0 else theme.moves.dark
                 # rect
@@ -91,7 +141,7 @@ class Game:
                 # blit
                 pygame.draw.rect(surface, color, rect)
 
-    def show_last_move(self, surface):
+    def show_last_move(self, surface, squares=None):
         theme = self.config.theme
 
         if self.board.last_move:
@@ -99,6 +149,8 @@ class Game:
             final = self.board.last_move.final
 
             for pos in [initial, final]:
+                if squares is not None and (pos.row, pos.col) not in squares:
+                    continue
                 # color
                 color = theme.trace.light if (pos.row + pos.col) % 2 == 0 else theme.trace.dark
                 # rect
@@ -106,8 +158,8 @@ class Game:
                 # blit
                 pygame.draw.rect(surface, color, rect)
 
-    def show_hover(self, surface):
-        if self.hovered_sqr:
+    def show_hover(self, surface, squares=None):
+        if self.hovered_sqr and (squares is None or (self.hovered_sqr.row, self.hovered_sqr.col) in squares):
             # color
             color = (180, 180, 180)
             # rect
@@ -123,8 +175,19 @@ class Game:
     def set_hover(self, row, col):
         self.hovered_sqr = self.board.squares[row][col]
 
+    def move_squares(self):
+        '''
+            Return the (row, col) squares of the dragged piece and its move hints.
+
+        '''
+        squares = {(self.dragger.initial_row, self.dragger.initial_col)}
+        if self.dragger.piece is not None:
+            squares |= {(move.final.row, move.final.col) for move in self.dragger.piece.moves}
+        return squares
+
     def change_theme(self):
         self.config.change_theme()
+        self.bg_surface = self._render_bg()
 
     def play_sound(self, captured=False):
         if captured:
@@ -0,0 +1,194 @@
+from const import *
+from board import Board
+from piece import *
+
+SAN_LETTERS = {'knight': 'N', 'bishop': 'B', 'rook': 'R', 'queen': 'Q', 'king': 'K'}
+
+
+class GameState:
+    """
+    A game of chess without any user interface: a Board plus the move history, for scripts and worker processes.
+
+    Nothing here imports pygame.
+
+    Attributes:
+        board (Board): The board of the current position.
+        history (list): The Undo records of the moves played, oldest first.
+        keys (list): The Zobrist keys of all positions of the game, for repetitions.
+
+    Methods:
+        side_to_move(): Returns the color to move.
+        legal_moves(): Returns the legal moves of the side to move.
+        push(move): Plays a legal move.
+        pop(): Takes back the last move.
+        from_fen(fen): Creates a game starting from a FEN position.
+        parse_uci(text) / push_uci(text): Finds / plays a move given as e2e4.
+        parse_san(text) / push_san(text): Finds / plays a move given as Nf3.
+        san(move): Returns the standard algebraic notation of a legal move.
+        has_legal_moves(): Checks if the side to move can move at all, without generating every move.
+        is_check(), is_checkmate(), is_stalemate(): The state of the side to move.
+        is_game_over(): Checks for mate, stalemate, the fifty move rule, threefold repetition and insufficient material.
+        result(): Returns '1-0', '0-1', '1/2-1/2' or '*'.
+    """
+
+    @classmethod
+    def from_fen(cls, fen):
+        return cls(Board.from_fen(fen))
+
+    def __init__(self, board=None):
+        self.board = board if board is not None else Board()
+        self.history = []
+        self.keys = [self.board.key]
+        self._legal = None
+
+    def side_to_move(self):
+        return self.board.next_player
+
+    def legal_moves(self):
+        '''
+            Return the legal moves of the side to move as Move objects, generated once per position.
+
+        '''
+        if self._legal is None or self._legal[0] != self.board.key:
+            self._legal = (self.board.key, [move for piece, move in self.board.legal_moves()])
+        return self._legal[1]
+
+    def push(self, move):
+        '''
+            Play a move of the side to move. It has to be one of legal_moves(), else ValueError is raised.
+
+        '''
+        if move not in self.legal_moves():
+            raise ValueError(f'illegal move {move.uci()}')
+        board = self.board
+        piece = board.squares[move.initial.row][move.initial.col].piece
+        undo = board.make_move(piece, move)
+        self.history.append(undo)
+        self.keys.append(board.key)
+
+    def pop(self):
+        '''
+            Take back the last move and return it.
+
+        '''
+        undo = self.history.pop()
+        self.keys.pop()
+        self.board.unmake_move(undo)
+        return undo.move
+
+    def parse_uci(self, text):
+        for move in self.legal_moves():
+            if move.uci() == text:
+                return move
+        raise ValueError(f'illegal move {text}')
+
+    def push_uci(self, text):
+        move = self.parse_uci(text)
+        self.push(move)
+        return move
+
+    def parse_san(self, text):
+        text = text.rstrip('+#!?').replace('0', 'O')
+        for move in self.legal_moves():
+            if self.san(move, suffix=False) == text:
+                return move
+        raise ValueError(f'illegal move {text}')
+
+    def push_san(self, text):
+        move = self.parse_san(text)
+        self.push(move)
+        return move
+
+    def san(self, move, suffix=True):
+        '''
+            Return the standard algebraic notation of a legal move of the side to move, with + or # if suffix is set.
+
+        '''
+        board = self.board
+        piece = board.squares[move.initial.row][move.initial.col].piece
+        target = f'{"abcdefgh"[move.final.col]}{ROWS - move.final.row}'
+
+        if isinstance(piece, King) and board.castling(move.initial, move.final):
+            s = 'O-O' if move.final.col > move.initial.col else 'O-O-O'
+        elif isinstance(piece, Pawn):
+            s = ''
+            if move.final.col != move.initial.col:
+                s = f'{"abcdefgh"[move.initial.col]}x'
+            s += target
+            if move.promotion:
+                s += '=' + SAN_LETTERS[move.promotion]
+        else:
+            s = SAN_LETTERS[piece.name]
+            #other pieces of the same kind that can reach the same square
+            others = [m for m in self.legal_moves()
+                      if m.final == move.final and not m.initial == move.initial
+                      and type(board.squares[m.initial.row][m.initial.col].piece) is type(piece)]
+            if others:
+                if all(m.initial.col != move.initial.col for m in others):
+                    s += 'abcdefgh'[move.initial.col]
+                elif all(m.initial.row != move.initial.row for m in others):
+                    s += str(ROWS - move.initial.row)
+                else:
+                    s += f'{"abcdefgh"[move.initial.col]}{ROWS - move.initial.row}'
+            if board.squares[move.final.row][move.final.col].has_piece():
+                s += 'x'
+            s += target
+
+        if suffix:
+            undo = board.make_move(piece, move)
+            if board.king_attacked(board.next_player):
+                s += '#' if next(board.generate_legal_moves(), None) is None else '+'
+            board.unmake_move(undo)
+        return s
+
+    def has_legal_moves(self):
+        '''
+            Check if the side to move has any legal move, stopping at the first one found.
+
+        '''
+        if self._legal is not None and self._legal[0] == self.board.key:
+            return bool(self._legal[1])
+        return next(self.board.generate_legal_moves(), None) is not None
+
+    def is_check(self):
+        return self.board.king_attacked(self.board.next_player)
+
+    def is_checkmate(self):
+        return self.is_check() and not self.has_legal_moves()
+
+    def is_stalemate(self):
+        return not self.is_check() and not self.has_legal_moves()
+
+    def is_fifty_moves(self):
+        return self.board.halfmove >= 100
+
+    def is_repetition(self, count=3):
+        return self.keys.count(self.board.key) >= count
+
+    def is_insufficient_material(self):
+        '''
+            Check if neither side has mating material: kings with at most one knight or bishop between them.
+
+        '''
+        minors = 0
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = self.board.squares[row][col].piece
+                if piece is None or isinstance(piece, King):
+                    continue
+                if isinstance(piece, (Knight, Bishop)):
+                    minors += 1
+                else:
+                    return False
+        return minors <= 1
+
+    def is_game_over(self):
+        return (not self.has_legal_moves() or self.is_fifty_moves() or self.is_repetition()
+                or self.is_insufficient_material())
+
+    def result(self):
+        if self.is_checkmate():
+            return '0-1' if self.board.next_player == 'white' else '1-0'
+        if self.is_game_over():
+            return '1/2-1/2'
+        return '*'
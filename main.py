@@ -6,8 +6,10 @@ from game import Game
 from dragger import Dragger
 from square import Square
 from move import Move
+from piece import Pawn
 from theme import Theme
 from color import Color
+from frametimer import FrameTimer
 
 
 
@@ -29,15 +31,27 @@ Dependencies:
 Attributes:
     screen (pygame.Surface): The Pygame window surface.
     game (Game): The instance of the Game class representing the chess game.
+    dirty (bool): Whether frames only redraw the squares that changed instead of the whole board.
+    fps (int): The maximum number of frames per second.
+    clock (pygame.time.Clock): Keeps the frame rate at or below fps.
+    timer (FrameTimer): Measures the time spent in each frame.
 
 Methods:
     mainloop(self): The main loop of the game that handles user input and updates the game state accordingly.
 """
-    def __init__(self):
+    STATS_EVENT = pygame.USEREVENT + 1
+
+    def __init__(self, dirty=True, fps=FPS):
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption('Chess')
         self.game = Game()
+        self.dirty = dirty
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        self.timer = FrameTimer()
+        #wakes the loop once a second to show the frame stats
+        pygame.time.set_timer(self.STATS_EVENT, 1000)
 
     def mainloop(self):
 
@@ -45,19 +59,21 @@ Methods:
         game = self.game
         board = self.game.board
         dragger = self.game.dragger
+        timer = self.timer
 
+        #squares to redraw in the next frame, and where the dragged piece was drawn last
+        dirty = game.all_squares()
+        drag_rect = None
 
         while True:
-            game.show_bg(screen)
-            game.show_last_move(screen)
-            game.show_moves(screen)
-            game.show_pieces(screen)
-            game.show_hover(screen)
-
-            if dragger.dragging:
-                dragger.update_blit(screen)
-
-            for event in pygame.event.get():
+            #nothing to draw and nothing moving: sleep until the next event
+            if self.dirty and not dirty and not dragger.dragging:
+                events = [pygame.event.wait()] + pygame.event.get()
+            else:
+                events = pygame.event.get()
+            timer.start()
+
+            for event in events:
     	    
                 #click
                 if event.type == pygame.MOUSEBUTTONDOWN:
@@ -70,29 +86,23 @@ Methods:
                         piece = board.squares[clicked_row][clicked_col].piece
                         #valid piece(color)
                         if piece.color == game.next_player:
-                            board.calc_moves(piece, clicked_row, clicked_col, bool = True)
+                            board.load_moves(piece, clicked_row, clicked_col)
                             dragger.save_initial(event.pos)
                             dragger.drag_piece(piece)
-                            #show methods
-                            game.show_bg(screen)
-                            game.show_last_move(screen)
-                            game.show_moves(screen)
-                            game.show_pieces(screen)
+                            #the piece leaves its square and its moves light up
+                            dirty |= game.move_squares()
                  
                 #motion
                 elif event.type == pygame.MOUSEMOTION:
                     motion_row = event.pos[1] // SQSIZE
                     motion_col = event.pos[0] // SQSIZE
+                    if game.hovered_sqr:
+                        dirty.add((game.hovered_sqr.row, game.hovered_sqr.col))
                     game.set_hover(motion_row, motion_col)
+                    dirty.add((motion_row, motion_col))
 
                     if dragger.dragging:
                         dragger.update_mouse(event.pos)
-                        game.show_bg(screen)
-                        game.show_last_move(screen)
-                        game.show_moves(screen)
-                        game.show_pieces(screen)
-                        game.show_hover(screen)
-                        dragger.update_blit(screen)
                 
                 #click release
                 elif event.type == pygame.MOUSEBUTTONUP:
@@ -101,23 +111,26 @@ Methods:
                         dragger.update_mouse(event.pos)
                         released_row = dragger.mouseY // SQSIZE
                         released_col = dragger.mouseX // SQSIZE
+                        dirty |= game.move_squares()
 
                         #possible move
                         initial = Square(dragger.initial_row, dragger.initial_col)
                         final = Square(released_row, released_col)
                         move = Move(initial, final)
+                        #dragged pawns always promote to a queen
+                        if isinstance(dragger.piece, Pawn) and (released_row == 0 or released_row == 7):
+                            move.promotion = 'queen'
 
                         if board.valid_move(dragger.piece, move):
-                            #normal capture
-                            captured = board.squares[released_row][released_col].has_piece()
-                            board.move(dragger.piece, move)
+                            #normal or en passant capture
+                            undo = board.move(dragger.piece, move)
+                            captured = undo.captured is not None
 
                             board.set_true_en_passant(dragger.piece)
                             #sound
                             game.play_sound(captured)
-                            #show methods
-                            game.show_last_move(screen)
-                            game.show_pieces(screen)
+                            #castling, en passant and the last move trace change squares all over the board
+                            dirty = game.all_squares()
                             #next turn
                             game.next_turn()
 
@@ -138,15 +151,52 @@ Methods:
                         board = self.game.board
                         dragger = self.game.dragger
 
+                    #switch between dirty and full redraws
+                    if event.key == pygame.K_d:
+                        self.dirty = not self.dirty
+                        timer.times.clear()
+
+                    dirty = game.all_squares()
+
+
+                #frame stats in the window title
+                elif event.type == self.STATS_EVENT:
+                    mode = 'dirty' if self.dirty else 'full'
+                    pygame.display.set_caption(f'Chess - {mode} redraw {self.clock.get_fps():.0f} fps, '
+                                               f'{timer.average_ms():.2f} ms/frame, max {timer.max_ms():.2f} ms, '
+                                               f'{timer.load():.0%} busy')
 
                 #quit
                 elif event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
 
+            #the dragged piece erases where it was and is drawn where it is
+            if dragger.dragging:
+                dirty |= game.squares_in_rect(drag_rect)
+                dirty |= game.squares_in_rect(pygame.Rect(dragger.mouseX - 64, dragger.mouseY - 64, 128, 128))
+            elif drag_rect is not None:
+                dirty |= game.squares_in_rect(drag_rect)
+                drag_rect = None
 
-               
-            pygame.display.update()
+            if self.dirty and not dirty:
+                timer.cancel()
+                continue
+
+            rects = game.render(screen, dirty if self.dirty else None)
+            if dragger.dragging:
+                dragger.update_blit(screen, game.config.textures)
+                drag_rect = dragger.piece.texture_rect
+
+            if self.dirty:
+                pygame.display.update(rects)
+            else:
+                pygame.display.update()
+            timer.stop()
+            dirty = set()
+
+            #sleep what is left of the frame
+            self.clock.tick(self.fps)
 
 main = Main()
 main.mainloop()
@@ -1,53 +1,25 @@
 from __future__ import print_function, division
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
 import torch
 import glob
-import re
 import torch.nn as nn
-import torch.optim as optim
-import torchvision
 import os
 import copy
+import random
+import time
 import cv2 
 import torch.nn.functional as F
 
-from PIL import Image
-from os import listdir, makedirs, getcwd, remove
-from os.path import isfile, join, abspath, exists, isdir, expanduser
-from torch.optim import lr_scheduler
-from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms, utils
-from torchvision import datasets, models, transforms
-from torch.autograd import Variable
-from torch.utils import data
-from IPython.display import clear_output
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+from preprocess import (blockshaped, fen_from_filename, get_all_labels, img_processing, img_processing_batch,
+                        fen_to_piece_label, label_to_fen, labels_to_fen)
 
-# Ignore warnings
-import warnings
-warnings.filterwarnings("ignore")
-
-plt.ion()   
-
-import os
-
-train = glob.glob(r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess\train\*.jpeg")
-test = glob.glob(r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess\test\*.jpeg")
-
-from random import shuffle
-shuffle(train)
+#importing this module only defines things: the datasets are found by get_datasets(), the device is chosen by
+#get_device() and the network is built by create_model(), all on first use
 
+#folder with the train and test folders of board images, CHESS_DATASET overrides it
+dataset_root = os.environ.get('CHESS_DATASET', r"C:\Users\KaiTs\Documents\Data Science\Datasets\Chess")
 trainset_size = 75000
-cross_val = train[trainset_size:]
-train = train[:trainset_size]
-
-# CUDA for PyTorch
-use_cuda = torch.cuda.is_available()
-device = torch.device("cuda:0" if use_cuda else "cpu")
-torch.backends.cudnn.benchmark = True
-print(device)
 
 ###### giving metrics to neural net #####
 n_in, n_out = 625, 13
@@ -57,6 +29,13 @@ h3 = 40
 h4 = 30
 h5 = 20
 batch_size = 5
+#boards decoded in parallel by DataLoader worker processes, and batches each worker prepares ahead of the training loop
+num_workers = min(8, os.cpu_count() or 1)
+prefetch_factor = 4
+#decoded tiles of every board, written once and memory mapped by the following runs, CHESS_TILE_CACHE overrides it
+cache_dir = os.environ.get('CHESS_TILE_CACHE', 'tile_cache')
+train_cache = os.path.join(cache_dir, 'train')
+test_cache = os.path.join(cache_dir, 'test')
 learning_rate = 1e-4
 momentum = 0.9
 weight_decay = 0.0000001
@@ -82,145 +61,70 @@ class NeuralNet(nn.Module):
         x = self.f6(x)        
         return F.log_softmax(x)
     
-# CREATING THE NEURAL NETWORK
-model = NeuralNet(n_in, h1, h2, h3, h4, h5, n_out).to(device)
-
-# Loss and optimizer
-criterion = nn.CrossEntropyLoss()
-optimizer = torch.optim.RMSprop(model.parameters(), lr=learning_rate, momentum=momentum, weight_decay=weight_decay)
-
-# Device configuration
-
-##blockshaped(arr, nrows, ncols)**
-    #given a 2d numpy array as arr this fuction will cut the array into sub array with shape (nrows, ncols)
-
-
-##fen_from_filename(filename)**
-    #the filename of each image contains it's solution i.e. the real fen code it extracts it.**
-
-##get_all_labels(list_filename)**
-    #al 1d list of file names get_all_labels return a list of the actual FEN code list
-
-def blockshaped(arr, nrows, ncols):
-    h, w = arr.shape
-    return (arr.reshape(h//nrows, nrows, -1, ncols)
-               .swapaxes(1,2)
-               .reshape(-1, nrows, ncols))
-
-def fen_from_filename(filename):
-  return os.path.splitext(os.path.basename(filename))[0]
-
-def get_all_labels(list_filename):
-    labels = []
-    for i in range(len(list_filename)):
-        labels.append(fen_from_filename(list_filename[i]))
-    return labels
-
-##*img_processing(img)**
-        #Given a RGB image file location with 3 channels this will convert into single channel(grayscale) then shrinks image to (200, 200), cuts the image , and then      flattens the 2d subimage to single image
-##fen_to_piece_label(fen)**
-        #given a FEN code of a board it return enumerates labels i.e 64 labels
-##lb_to_fen(label)**
-    #given 64 labels lb_to_fen returns label into a string of FEN code
-##lbs_to_fen(label)**
-   #given 64 X N labels lbs_to_fen changes return list of FEN codes of length N.
-
-
-def img_processing(img):
-    img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    img_shrink = cv2.resize(img_gray, (200, 200))
-    box_list = blockshaped(img_shrink, 25, 25)
-    flatten_list = box_list.reshape(box_list.shape[0], -1)
-    return flatten_list
-
-def fen_to_piece_label(fen):
-    y = []
-    for i in fen:
-        if(str.isdigit(i)):
-            d = int(i, 10)
-            y.extend(np.zeros(d, np.int16).tolist())
-        elif(str.isalpha(i)):
-            case = 0
-            if(str.isupper(i)):
-                case = 6
-                i = str.lower(i)
-                
-            if(i == 'k'):
-                case = case + 1
-            elif(i == 'q'):
-                case = case + 2               
-            elif(i == 'r'):
-                case = case + 3
-            elif(i == 'n'):
-                case = case + 4
-            elif(i == 'b'):
-                case = case + 5
-            elif(i == 'p'):
-                case = case + 6
-            y.append(case)
-    return y
-
-
-def label_to_fen(label):
-    s = ''
-    count = 0
-    for i in range(len(label)):
-        if i % 8 == 0:
-            if count != 0:
-                s += str(count)
-                count = 0
-            if i != 0:
-                s += '-'
-        if label[i] == 0:
-            count += 1
-        else:
-            if count != 0:
-                s += str(count)
-                count = 0
-            if label[i] == 1:
-                s += 'k'
-            elif label[i] == 2:
-                s += 'q'
-            elif label[i] == 3:
-                s += 'r'
-            elif label[i] == 4:
-                s += 'n'
-            elif label[i] == 5:
-                s += 'b'
-            elif label[i] == 6:
-                s += 'p'
-            elif label[i] == 7:
-                s += 'K'
-            elif label[i] == 8:
-                s += 'Q'
-            elif label[i] == 9:
-                s += 'R'
-            elif label[i] == 10:
-                s += 'N'
-            elif label[i] == 11:
-                s += 'B'
-            elif label[i] == 12:
-                s += 'P'
-            else:
-                print('Invalid Error#######################################')
-    if count != 0:
-        s += str(count)
-    return s
-
-
-def labels_to_fen(label):
-    fen = []
-    for grp_no in range(0, int(len(label)/ 64)):
-        start_index = grp_no*64
-        fen.append(label_to_fen(label[start_index : start_index +64]))
-    return fen
+##export_onnx(model, path)
+    #ONNX copy of the model for onnxruntime, any number of tiles per call, see FENPredictor('model_chess.onnx')
+
+##export_quantized(model, path)
+    #int8 dynamically quantized copy of the model (weights of all nn.Linear layers), traced with TorchScript and saved to
+    #path for CPU inference, see FENPredictor(path, quantized=True)
+
+def export_onnx(model, path):
+    model = copy.deepcopy(model).cpu().eval()
+    torch.onnx.export(model, torch.zeros(64, n_in), path, input_names=['tiles'], output_names=['log_probs'],
+                      dynamic_axes={'tiles': {0: 'tiles'}, 'log_probs': {0: 'tiles'}}, opset_version=13)
+
+def export_quantized(model, path):
+    model = copy.deepcopy(model).cpu().eval()
+    quantized = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, torch.zeros(64, n_in))
+    torch.jit.save(traced, path)
+    return traced
+
+##get_datasets(root)
+    #the shuffled train, cross validation and test lists of board images below root, found once and then kept
+
+##get_device()
+    #the CUDA device if there is one, else the CPU
+
+##create_model(device)
+    #a new NeuralNet on device with its loss and optimizer
+
+_datasets = {}
+_device = None
+
+def get_datasets(root=None):
+    root = root or dataset_root
+    if root not in _datasets:
+        train = glob.glob(os.path.join(root, 'train', '*.jpeg'))
+        test = glob.glob(os.path.join(root, 'test', '*.jpeg'))
+        random.shuffle(train)
+        _datasets[root] = (train[:trainset_size], train[trainset_size:], test)
+    return _datasets[root]
+
+def get_device():
+    global _device
+    if _device is None:
+        # CUDA for PyTorch
+        _device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    return _device
+
+def create_model(device=None):
+    # CREATING THE NEURAL NETWORK
+    model = NeuralNet(n_in, h1, h2, h3, h4, h5, n_out).to(device or get_device())
+
+    # Loss and optimizer
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.RMSprop(model.parameters(), lr=learning_rate, momentum=momentum, weight_decay=weight_decay)
+    return model, criterion, optimizer
+
+
+##blockshaped, fen_from_filename, get_all_labels, img_processing, img_processing_batch, fen_to_piece_label,
+##label_to_fen and labels_to_fen live in preprocess.py, which needs neither torch nor pandas
 
 ##decoded_board_with_label(board)
     #given a board address , it reads the file and return image matrix (after processing) and its labels
 
-##get_batch(dataset, batch_size, start_index) **
-    #get_batch returns the image matrix(after processing) and its label in group of size batch_size starting form start_index in dataset
-
 def decoded_board_with_label(board):
     X = []
     Y = []
@@ -229,28 +133,148 @@ def decoded_board_with_label(board):
     return X, Y
 
 
-def  get_batch(dataset, batch_size, start_index):
-    x = []
-    y = []
-    for j in range(0, batch_size):
-        temp_x, temp_y = decoded_board_with_label(dataset[start_index+ j])
-        x.extend(temp_x)
-        y.extend(temp_y)
-    x = torch.FloatTensor(x)
-    y = torch.FloatTensor(y)
-    return x, y
+##ChessBoardDataset(dataset)
+    #torch Dataset of the board images in dataset, indexed with a batch of boards returns their N x 64 x 625 tiles (uint8)
+    #and N x 64 labels
+
+##get_loader(dataset, batch_size, shuffle)
+    #DataLoader over ChessBoardDataset that decodes boards in num_workers processes and prefetches batches into pinned memory
+
+class ChessBoardDataset(Dataset):
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        #index is a list of boards from the batch sampler, a whole batch is preprocessed in one vectorized pass
+        boards = [self.dataset[i] for i in index]
+        x = img_processing_batch([cv2.imread(board) for board in boards])
+        y = np.array([fen_to_piece_label(fen_from_filename(board)) for board in boards], dtype=np.int64)
+        #tiles stay uint8 until they reach the device, a quarter of the float32 bytes through the worker queues
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+
+def _worker_init(worker_id):
+    #every worker decodes one batch at a time, OpenCV threads on top of the processes only compete for the cores
+    cv2.setNumThreads(0)
+
+
+def get_loader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers, prefetch_factor=prefetch_factor):
+    kwargs = {}
+    if num_workers > 0:
+        kwargs = dict(prefetch_factor=prefetch_factor, persistent_workers=True, worker_init_fn=_worker_init)
+    boards = ChessBoardDataset(dataset)
+    sampler = BatchSampler(RandomSampler(boards) if shuffle else SequentialSampler(boards), batch_size, drop_last=False)
+    #batch_size None: the sampler hands out whole batches
+    return DataLoader(boards, sampler=sampler, batch_size=None, num_workers=num_workers, pin_memory=get_device().type == 'cuda', **kwargs)
+
+
+def to_device(x_batch, y_batch):
+    #(boards, 64, 625) uint8 tiles to (boards * 64, 625) float rows, one row per square
+    device = get_device()
+    x_batch = x_batch.to(device, non_blocking=True).view(-1, n_in).float()
+    y_batch = y_batch.to(device, non_blocking=True).view(-1).long()
+    return x_batch, y_batch
+
+##build_tile_cache(dataset, path)
+    #decodes every board of dataset once and writes path.tiles.npy (N x 64 x 625 uint8), path.labels.npy (N x 64 uint8)
+    #and path.index.txt, the file name of each row, sorted
+
+##TileCacheDataset(dataset, path, cache_files)
+    #torch Dataset of the boards of dataset read from the memory mapped tile cache at path, built from cache_files if
+    #any board is missing; indexed with a batch of boards, consecutive rows come back as views without a copy
+
+##get_cached_loader(dataset, path, batch_size, shuffle, cache_files)
+    #DataLoader over TileCacheDataset, one read of the memory map per batch
+
+def build_tile_cache(dataset, path, batch_size=64):
+    files = sorted(dataset, key=os.path.basename)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path + '.index.txt'):
+        os.remove(path + '.index.txt')
+    tiles = np.lib.format.open_memmap(path + '.tiles.npy', mode='w+', dtype=np.uint8, shape=(len(files), 64, n_in))
+    labels = np.lib.format.open_memmap(path + '.labels.npy', mode='w+', dtype=np.uint8, shape=(len(files), 64))
+    start = 0
+    for x_batch, y_batch in get_loader(files, batch_size):
+        end = start + len(x_batch)
+        tiles[start:end] = x_batch.numpy()
+        labels[start:end] = y_batch.numpy()
+        start = end
+    tiles.flush()
+    labels.flush()
+    del tiles, labels
+    #the index is written last, a cache without it was not finished
+    with open(path + '.index.txt', 'w') as f:
+        for board in files:
+            f.write(os.path.basename(board) + '\n')
+
+
+class TileCacheDataset(Dataset):
+    def __init__(self, dataset, path, cache_files=None):
+        names = self.read_index(path)
+        row_of = {name: row for row, name in enumerate(names)}
+        if any(os.path.basename(board) not in row_of for board in dataset):
+            build_tile_cache(cache_files if cache_files is not None else dataset, path)
+            names = self.read_index(path)
+            row_of = {name: row for row, name in enumerate(names)}
+        #the boards in the order of the cache, so that batches of them are consecutive rows
+        self.files = sorted(dataset, key=lambda board: row_of[os.path.basename(board)])
+        self.rows = np.array([row_of[os.path.basename(board)] for board in self.files], dtype=np.int64)
+        #copy on write maps give writable arrays that torch.from_numpy shares without copying
+        self.tiles = np.load(path + '.tiles.npy', mmap_mode='c')
+        self.labels = np.load(path + '.labels.npy', mmap_mode='c')
+
+    @staticmethod
+    def read_index(path):
+        if not os.path.exists(path + '.index.txt'):
+            return []
+        with open(path + '.index.txt') as f:
+            return f.read().split('\n')[:-1]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        #index is a slice or a list of boards, a whole batch is read at once
+        rows = self.rows[index]
+        if isinstance(index, slice) and len(rows) and rows[-1] - rows[0] == len(rows) - 1:
+            rows = slice(rows[0], rows[-1] + 1)
+        else:
+            rows = np.sort(rows)
+        return torch.from_numpy(self.tiles[rows]), torch.from_numpy(self.labels[rows])
+
+
+def get_cached_loader(dataset, path, batch_size=batch_size, shuffle=False, cache_files=None):
+    cache = TileCacheDataset(dataset, path, cache_files)
+    if shuffle:
+        sampler = BatchSampler(RandomSampler(cache), batch_size, drop_last=False)
+    else:
+        sampler = [slice(i, min(i + batch_size, len(cache))) for i in range(0, len(cache), batch_size)]
+    return DataLoader(cache, sampler=sampler, batch_size=None, pin_memory=get_device().type == 'cuda')
 
 
 if __name__ == "__main__":
+    import warnings
+    warnings.filterwarnings("ignore")
+
+    train, cross_val, test = get_datasets()
+    torch.backends.cudnn.benchmark = True
+    print(get_device())
+    model, criterion, optimizer = create_model()
+
+    #the cache holds the cross validation boards too, the split changes with every run
+    train_loader = get_cached_loader(train, train_cache, batch_size, shuffle=True, cache_files=train + cross_val)
     for epoch in range(epochs):
-        batch_count = int(len(train)/ batch_size)
-        for i in range(0, batch_count):  
-            
-            x_batch, y_batch = get_batch(train, batch_size, batch_size*i)
-            
+        batch_count = len(train_loader)
+        images = 0
+        start = time.perf_counter()
+        for i, (x_batch, y_batch) in enumerate(train_loader):
+            images += len(x_batch)
+
             # Loading batch to the GPU
-            x_batch = x_batch.to(device)
-            y_batch = y_batch.type(torch.LongTensor).to(device)
+            x_batch, y_batch = to_device(x_batch, y_batch)
             
             # Forward pass
             outputs = model(x_batch)
@@ -262,21 +286,27 @@ if __name__ == "__main__":
             loss.backward()
             optimizer.step()
 
-    def dataset_accuracy_finder(dataset, batch_size):
+        seconds = time.perf_counter() - start
+        print('epoch: ', epoch, 'images: ', images, 'time: ', round(seconds, 1), 's', 'images/s: ', round(images / seconds, 1))
 
-    # Getting all the actual Test label 
-        actual_FEN = get_all_labels(dataset)
+    def dataset_accuracy_finder(dataset, batch_size, cache):
+        loader = get_cached_loader(dataset, cache, batch_size)
+
+    # Getting all the actual Test label, in the order of the cache
+        actual_FEN = get_all_labels(loader.dataset.files)
         Correct_lbs = 0
         y_actual = []
         y_pred = []
-        batch_count = int(len(dataset)/ batch_size)
+        images = 0
+        start = time.perf_counter()
 
-        for i in range(0, batch_count):
-                x_batch, y_batch = get_batch(dataset, batch_size, batch_size*i)
-                y_actual.extend(y_batch.numpy().tolist())
+        with torch.no_grad():
+            for i, (x_batch, y_batch) in enumerate(loader):
+                images += len(x_batch)
+                y_actual.extend(y_batch.view(-1).numpy().tolist())
                 
                 # Loading Features to the GPU
-                x_batch = x_batch.to(device)
+                x_batch, y_batch = to_device(x_batch, y_batch)
             
                 # Predicting on the model
                 y_batch_pred = model(x_batch)
@@ -284,6 +314,9 @@ if __name__ == "__main__":
                 y_pred.extend(y_batch_pred)
                 print(i)
 
+        seconds = time.perf_counter() - start
+        print('images: ', images, 'images/s: ', round(images / seconds, 1))
+
         y_actual = np.array(y_actual)
         y_pred = np.array(y_pred)
         Correct_lbs = np.count_nonzero(y_actual == y_pred)
@@ -298,9 +331,9 @@ if __name__ == "__main__":
                 Correct_fen = Correct_fen + 1
         return Correct_lbs/(len(y_pred)), Correct_fen/len(actual_FEN)
 
-    train_err, train_actual_err = dataset_accuracy_finder(train, 500)
-    cross_val_err, cross_val_actual_err = dataset_accuracy_finder(cross_val, 500)
-    test_err, test_actual_err = dataset_accuracy_finder(test, 500)
+    train_err, train_actual_err = dataset_accuracy_finder(train, 500, train_cache)
+    cross_val_err, cross_val_actual_err = dataset_accuracy_finder(cross_val, 500, train_cache)
+    test_err, test_actual_err = dataset_accuracy_finder(test, 500, test_cache)
 
     print('============================================================================================')
     print('    Dataset                   (  Label   )                  (  FEN code  )    ')
@@ -308,5 +341,7 @@ if __name__ == "__main__":
     print('    DEV                        ',cross_val_err, '              ' , cross_val_actual_err)
     print('    Test                       ',test_err, '                   ' , test_actual_err)
 
-#torch.save(model, 'model_chess.pth')
-    torch.save(model, 'model_chess.pth')
\ No newline at end of file
+    #only the weights: a pickled module would refer to __main__.NeuralNet and could not be loaded from fen.py
+    torch.save(model.state_dict(), 'model_chess.pth')
+    export_quantized(model, 'model_chess_int8.pt')
+    export_onnx(model, 'model_chess.onnx')
\ No newline at end of file
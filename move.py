@@ -1,15 +1,123 @@
+from square import Square
+
+
 class Move:
+    PROMOTIONS = ('queen', 'rook', 'bishop', 'knight')
+    #the flags of the 16 bit encoding, the same as in bitboard.py
+    DOUBLE_PUSH = 1
+    CASTLE = 2
+    EN_PASSANT = 3
+    PROMOTION_FLAGS = {'knight': 4, 'bishop': 5, 'rook': 6, 'queen': 7}
+    PROMOTION_NAMES = {4: 'knight', 5: 'bishop', 6: 'rook', 7: 'queen'}
 
-    def __init__(self, initial, final):
+    __slots__ = ('initial', 'final', 'promotion')
+
+    def __init__(self, initial, final, promotion = None):
         #initial and final are squares
         self.initial = initial
         self.final = final
+        #name of the piece a pawn promotes to
+        self.promotion = promotion
 
     def __str__(self):
         s = ''
         s += f'({self.initial.col}, {self.initial.row})'
         s += f' -> ({self.final.col}, {self.final.row})'
+        if self.promotion:
+            s += f' = {self.promotion}'
+        return s
+
+    def uci(self):
+        '''
+            Return the move in UCI long algebraic notation, e.g. e2e4 or e7e8q.
+
+        '''
+        s = f'{"abcdefgh"[self.initial.col]}{8 - self.initial.row}{"abcdefgh"[self.final.col]}{8 - self.final.row}'
+        if self.promotion:
+            s += 'n' if self.promotion == 'knight' else self.promotion[0]
         return s
-    
+
     def __eq__(self, other):
-        return self.initial == other.initial and self.final == other.final
\ No newline at end of file
+        return self.initial == other.initial and self.final == other.final and self.promotion == other.promotion
+
+    def encode(self, board=None):
+        '''
+            Return the move as a 16 bit int: from square | to square << 6 | flag << 12, squares as row * 8 + col.
+
+            Move lists and games kept in memory for analysis take a fraction of the space as ints. Without a board only
+            promotions are flagged; with the board the move is played on, double pushes, castling and en passant are
+            flagged too and the code is the one BitBoard generates.
+
+        '''
+        code = self.initial.row * 8 + self.initial.col | (self.final.row * 8 + self.final.col) << 6
+        if self.promotion:
+            return code | self.PROMOTION_FLAGS[self.promotion] << 12
+        if board is not None:
+            piece = board.squares[self.initial.row][self.initial.col].piece
+            name = piece.name if piece is not None else None
+            if name == 'pawn' and abs(self.final.row - self.initial.row) == 2:
+                code |= self.DOUBLE_PUSH << 12
+            elif name == 'pawn' and self.final.col != self.initial.col \
+                    and not board.squares[self.final.row][self.final.col].has_piece():
+                code |= self.EN_PASSANT << 12
+            elif name == 'king' and abs(self.final.col - self.initial.col) == 2:
+                code |= self.CASTLE << 12
+        return code
+
+    @classmethod
+    def decode(cls, code, board=None):
+        '''
+            Create the Move of a 16 bit int from encode(). With a board, the final square carries the piece on it like
+            the moves of Board.calc_moves.
+
+        '''
+        row, col = divmod(code & 63, 8)
+        final_row, final_col = divmod((code >> 6) & 63, 8)
+        piece = None
+        if board is not None:
+            piece = board.squares[final_row][final_col].piece
+            mover = board.squares[row][col].piece
+            #en passant takes the pawn beside the moving pawn
+            if piece is None and col != final_col and mover is not None and mover.name == 'pawn':
+                piece = board.squares[row][final_col].piece
+        return cls(Square(row, col), Square(final_row, final_col, piece), cls.PROMOTION_NAMES.get(code >> 12))
+
+
+class Undo:
+    """
+    Everything Board.make_move changes, so that Board.unmake_move can restore it.
+
+    Attributes:
+        piece (Piece): The piece that was moved.
+        move (Move): The move that was made.
+        moved (bool): The moved flag of the piece before the move.
+        last_move (Move or None): The last move of the board before the move.
+        captured (Piece or None): The captured piece, if any.
+        captured_square (Square or None): The square the captured piece stood on (differs from move.final on en passant).
+        promoted (Piece or None): The piece the pawn was promoted to, if any.
+        rook (Rook or None): The rook that was moved along when castling.
+        rook_initial (Square or None): The square the castling rook came from.
+        rook_final (Square or None): The square the castling rook went to.
+        rook_moved (bool): The moved flag of the castling rook before the move.
+        en_passant (list): The pawns whose en passant flag was set before the move.
+        key (int): The Zobrist key of the board before the move.
+        halfmove (int): The fifty move counter of the board before the move.
+    """
+    __slots__ = ('piece', 'move', 'moved', 'last_move', 'captured', 'captured_square', 'promoted', 'rook',
+                 'rook_initial', 'rook_final', 'rook_moved', 'en_passant', 'key', 'halfmove')
+
+    def __init__(self, piece, move, moved, last_move):
+        self.piece = piece
+        self.move = move
+        self.moved = moved
+        self.last_move = last_move
+        self.captured = None
+        self.captured_square = None
+        self.promoted = None
+        self.rook = None
+        self.rook_initial = None
+        self.rook_final = None
+        self.rook_moved = False
+        self.en_passant = []
+        self.key = 0
+        self.halfmove = 0
@@ -0,0 +1,142 @@
+import argparse
+import sys
+import time
+
+from const import *
+from board import Board
+from bitboard import BitBoard
+
+#published perft node counts, see https://www.chessprogramming.org/Perft_Results
+POSITIONS = [
+    ('startpos', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+def load_fen(fen):
+    '''
+        Set up a Board from a FEN string and return it with the color to move.
+
+    '''
+    board = Board.from_fen(fen)
+    return board, board.next_player
+
+
+def check_calc_moves(board):
+    '''
+        Check that calc_moves fills piece.moves with the same legal moves that generate_legal_moves yields.
+
+    '''
+    generated = [(piece, move.uci()) for piece, move in board.generate_legal_moves()]
+    filled = []
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board.squares[row][col].piece
+            if piece is not None and piece.color == board.next_player:
+                piece.clear_moves()
+                board.calc_moves(piece, row, col)
+                filled.extend((piece, move.uci()) for move in piece.moves)
+                piece.clear_moves()
+    return filled == generated
+
+
+def perft(board, color, depth):
+    '''
+        Count the leaf nodes of the legal move tree of the board, depth plies deep.
+
+    '''
+    if depth == 0:
+        return 1
+    moves = board.legal_moves(color)
+    if depth == 1:
+        return len(moves)
+    enemy = 'black' if color == 'white' else 'white'
+    nodes = 0
+    for piece, move in moves:
+        undo = board.make_move(piece, move)
+        nodes += perft(board, enemy, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def divide(board, color, depth):
+    '''
+        Count the leaf nodes below each root move, the usual way to find a move generation bug.
+
+    '''
+    enemy = 'black' if color == 'white' else 'white'
+    counts = {}
+    for piece, move in board.legal_moves(color):
+        undo = board.make_move(piece, move)
+        counts[move.uci()] = perft(board, enemy, depth - 1)
+        board.unmake_move(undo)
+    return counts
+
+
+def run(fen, depth, backend='board', show_divide=False):
+    '''
+        Run perft on a position and return the node count and the seconds it took.
+
+    '''
+    board, color = load_fen(fen)
+    if not check_calc_moves(board):
+        raise RuntimeError(f'calc_moves does not fill piece.moves with the legal moves of {fen}')
+    start = time.perf_counter()
+    if backend == 'bitboard':
+        nodes = BitBoard.from_board(board, color).perft(depth)
+    elif show_divide:
+        counts = divide(board, color, depth)
+        for name in sorted(counts):
+            print(f'{name}: {counts[name]}')
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, color, depth)
+    return nodes, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count perft leaf nodes of board.py move generation.')
+    parser.add_argument('--fen', help='position to count, runs the standard positions when left out')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count below each root move')
+    parser.add_argument('--backend', choices=['board', 'bitboard'], default='board')
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        positions = [('fen', args.fen, [])]
+    else:
+        positions = POSITIONS
+
+    failed = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in positions:
+        nodes, seconds = run(fen, args.depth, args.backend, args.divide)
+        total_nodes += nodes
+        total_time += seconds
+        nps = nodes / seconds if seconds else 0.0
+        if args.depth <= len(expected):
+            ok = nodes == expected[args.depth - 1]
+            failed += not ok
+            status = 'ok' if ok else f'FAIL expected {expected[args.depth - 1]}'
+        else:
+            status = ''
+        print(f'{name:10} depth {args.depth}  nodes {nodes:10}  {seconds:8.2f} s  {nps:10.0f} nps  {status}')
+
+    if len(positions) > 1:
+        nps = total_nodes / total_time if total_time else 0.0
+        print(f'{"total":10} depth {args.depth}  nodes {total_nodes:10}  {total_time:8.2f} s  {nps:10.0f} nps')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
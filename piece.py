@@ -1,5 +1,8 @@
 import os
 
+#one path string per texture, shared by all pieces that look alike
+TEXTURE_PATHS = {}
+
 class Piece:
     """
     Represents a chess piece.
@@ -18,6 +21,8 @@ class Piece:
         add_move(move): Adds a move to the list of possible moves for the piece.
         clear_moves(): Clears the list of possible moves for the piece.
     """
+    __slots__ = ('name', 'color', 'value', 'moves', 'moved', 'texture', 'texture_rect')
+
     def __init__(self, name, color, value, texture=None, texture_rect=None):
         self.name = name
         self.color = color
@@ -35,7 +40,11 @@ class Piece:
         self.texture_rect = texture_rect
 
     def set_texture(self, size = 80):
-        self.texture = os.path.join(f'assets/images/imgs-{size}px/{self.color}_{self.name}.png')
+        key = (self.color, self.name, size)
+        path = TEXTURE_PATHS.get(key)
+        if path is None:
+            path = TEXTURE_PATHS[key] = os.path.join(f'assets/images/imgs-{size}px/{self.color}_{self.name}.png')
+        self.texture = path
 
     def add_move(self, move):
         self.moves.append(move)
@@ -44,6 +53,7 @@ class Piece:
         self.moves = []
 
 class Pawn(Piece):
+    __slots__ = ('dir', 'en_passant')
 
     def __init__(self, color):
         if color == 'white':
@@ -54,23 +64,31 @@ class Pawn(Piece):
         super().__init__('pawn', color, 1.0)
  
 class Knight(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__('knight', color, 3.0)
 
 class Bishop(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__('bishop', color, 3.001)
 
 class Rook(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__('rook', color, 5.0)
 
 class Queen(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__('queen', color, 9.0)
 
 class King(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
-        self.left_rook = None
-        self.right_rook = None
         super().__init__('king', color, 10000.0)
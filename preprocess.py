@@ -0,0 +1,161 @@
+import os
+import cv2
+import numpy as np
+
+#preprocessing of board images and the conversion between FEN codes and labels, shared by training (model.py) and
+#recognition (fen.py); only numpy and cv2, so that recognition workers do not need torch
+
+##blockshaped(arr, nrows, ncols)**
+    #given a 2d numpy array as arr this fuction will cut the array into sub array with shape (nrows, ncols)
+
+
+##fen_from_filename(filename)**
+    #the filename of each image contains it's solution i.e. the real fen code it extracts it.**
+
+##get_all_labels(list_filename)**
+    #al 1d list of file names get_all_labels return a list of the actual FEN code list
+
+def blockshaped(arr, nrows, ncols):
+    h, w = arr.shape
+    return (arr.reshape(h//nrows, nrows, -1, ncols)
+               .swapaxes(1,2)
+               .reshape(-1, nrows, ncols))
+
+def fen_from_filename(filename):
+  return os.path.splitext(os.path.basename(filename))[0]
+
+def get_all_labels(list_filename):
+    labels = []
+    for i in range(len(list_filename)):
+        labels.append(fen_from_filename(list_filename[i]))
+    return labels
+
+##*img_processing(img)**
+        #Given a RGB image file location with 3 channels this will convert into single channel(grayscale) then shrinks image to (200, 200), cuts the image , and then      flattens the 2d subimage to single image
+##fen_to_piece_label(fen)**
+        #given a FEN code of a board it return enumerates labels i.e 64 labels
+##lb_to_fen(label)**
+    #given 64 labels lb_to_fen returns label into a string of FEN code
+##lbs_to_fen(label)**
+   #given 64 X N labels lbs_to_fen changes return list of FEN codes of length N.
+
+
+##img_processing_batch(imgs)**
+        #the same as img_processing for N images at once: N x H x W x 3 uint8 (or a list of images) to N x 64 x 625 uint8,
+        #one cvtColor call for the whole batch, one resize per board into a preallocated array and no python lists of tiles
+
+def img_processing(img):
+    img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    img_shrink = cv2.resize(img_gray, (200, 200))
+    box_list = blockshaped(img_shrink, 25, 25)
+    flatten_list = box_list.reshape(box_list.shape[0], -1)
+    return flatten_list
+
+def img_processing_batch(imgs):
+    if isinstance(imgs, (list, tuple)):
+        if len(set(img.shape for img in imgs)) > 1:
+            return np.stack([img_processing(img) for img in imgs])
+        imgs = np.stack(imgs)
+    imgs = np.ascontiguousarray(imgs)
+    n, h, w = imgs.shape[:3]
+    #the colour conversion works pixel by pixel, the boards on top of each other are one tall image
+    img_gray = cv2.cvtColor(imgs.reshape(n * h, w, 3), cv2.COLOR_BGR2GRAY).reshape(n, h, w)
+    #resize board by board, resizing boards stacked as channels rounds differently than img_processing
+    img_shrink = np.empty((n, 200, 200), np.uint8)
+    for i in range(n):
+        img_shrink[i] = cv2.resize(img_gray[i], (200, 200))
+    #64 tiles of 25 x 25 per board in the order of blockshaped, each flattened to 625 pixels
+    return img_shrink.reshape(n, 8, 25, 8, 25).swapaxes(2, 3).reshape(n, 64, 625)
+
+def fen_to_piece_label(fen):
+    y = []
+    for i in fen:
+        if(str.isdigit(i)):
+            d = int(i, 10)
+            y.extend(np.zeros(d, np.int16).tolist())
+        elif(str.isalpha(i)):
+            case = 0
+            if(str.isupper(i)):
+                case = 6
+                i = str.lower(i)
+                
+            if(i == 'k'):
+                case = case + 1
+            elif(i == 'q'):
+                case = case + 2               
+            elif(i == 'r'):
+                case = case + 3
+            elif(i == 'n'):
+                case = case + 4
+            elif(i == 'b'):
+                case = case + 5
+            elif(i == 'p'):
+                case = case + 6
+            y.append(case)
+    return y
+
+
+def label_to_fen(label):
+    s = ''
+    count = 0
+    for i in range(len(label)):
+        if i % 8 == 0:
+            if count != 0:
+                s += str(count)
+                count = 0
+            if i != 0:
+                s += '-'
+        if label[i] == 0:
+            count += 1
+        else:
+            if count != 0:
+                s += str(count)
+                count = 0
+            if label[i] == 1:
+                s += 'k'
+            elif label[i] == 2:
+                s += 'q'
+            elif label[i] == 3:
+                s += 'r'
+            elif label[i] == 4:
+                s += 'n'
+            elif label[i] == 5:
+                s += 'b'
+            elif label[i] == 6:
+                s += 'p'
+            elif label[i] == 7:
+                s += 'K'
+            elif label[i] == 8:
+                s += 'Q'
+            elif label[i] == 9:
+                s += 'R'
+            elif label[i] == 10:
+                s += 'N'
+            elif label[i] == 11:
+                s += 'B'
+            elif label[i] == 12:
+                s += 'P'
+            else:
+                print('Invalid Error#######################################')
+    if count != 0:
+        s += str(count)
+    return s
+
+
+def labels_to_fen(label):
+    fen = []
+    for grp_no in range(0, int(len(label)/ 64)):
+        start_index = grp_no*64
+        fen.append(label_to_fen(label[start_index : start_index +64]))
+    return fen
+
+
+#python preprocess.py checks that img_processing_batch gives exactly the tiles of img_processing, board by board
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for shape in ((3, 400, 400, 3), (5, 437, 411, 3), (1, 200, 200, 3)):
+        imgs = rng.integers(0, 256, shape, dtype=np.uint8)
+        batch = img_processing_batch(imgs)
+        for img, tiles in zip(imgs, batch):
+            assert np.array_equal(tiles, img_processing(img)), shape
+    print('img_processing_batch matches img_processing')
@@ -2,11 +2,17 @@ class Square:
     ALPHACOLS = {0: 'a', 1: 'b', 2: 'c', 3: 'd', 4: 'e', 5: 'f',6: 'g', 7: 'h'}
 
 
+    #no per instance __dict__, boards and move lists hold a lot of squares
+    __slots__ = ('row', 'col', 'piece')
+
     def __init__(self, row, col, piece = None):
         self.row = row
         self.col = col
         self.piece = piece
-        self.alphacols = self.ALPHACOLS[col]
+
+    @property
+    def alphacols(self):
+        return self.ALPHACOLS[self.col]
 
     def __eq__(self,other):
         return self.row == other.row and self.col == other.col
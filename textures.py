@@ -0,0 +1,23 @@
+import pygame
+
+class Textures:
+    """
+    Cache of the piece images, so that each image file is decoded once instead of on every frame.
+
+    Attributes:
+        images (dict): The converted pygame.Surface of each texture file path.
+
+    Methods:
+        get(piece, size=80): Returns the image of a piece in the given size.
+    """
+    def __init__(self):
+        self.images = {}
+
+    def get(self, piece, size = 80):
+        piece.set_texture(size=size)
+        img = self.images.get(piece.texture)
+        if img is None:
+            #convert to the display format once, so blits need no conversion
+            img = pygame.image.load(piece.texture).convert_alpha()
+            self.images[piece.texture] = img
+        return img
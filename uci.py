@@ -0,0 +1,201 @@
+import sys
+import threading
+
+from engine import Engine, MATE, MATE_BOUND
+from gamestate import GameState
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+class UCI:
+    """
+    Universal Chess Interface front-end for the engine, so that chess GUIs and tools like cutechess-cli can play it.
+
+    Commands are read from stdin and answered on stdout. Searches run on a background thread, so that stop, isready
+    and quit are answered while the engine thinks.
+
+    Attributes:
+        engine (Engine): The engine that searches the positions.
+        state (GameState): The position set by the last position command.
+        thread (threading.Thread): The running search, or None.
+
+    Methods:
+        loop(input=None): Handles commands until quit or the end of the input.
+        command(line): Handles a single command, returns False on quit.
+    """
+
+    NAME = 'Chess-and-AI'
+    AUTHOR = 'Chess-and-AI'
+    #milliseconds kept back from every move for the GUI and the process pipes
+    OVERHEAD = 50
+
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.lock = threading.Lock()
+        self.engine = Engine()
+        self.state = GameState()
+        self.thread = None
+        self.infinite = False
+        self.stopping = threading.Event()
+
+    def send(self, text):
+        with self.lock:
+            self.output.write(text + '\n')
+            self.output.flush()
+
+    def loop(self, input=None):
+        for line in (input or sys.stdin):
+            if not self.command(line):
+                break
+        self.stop()
+
+    def command(self, line):
+        '''
+            Handle one line of the protocol. Unknown commands are ignored, as the protocol asks.
+
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+        name, args = tokens[0], tokens[1:]
+
+        if name == 'uci':
+            self.send(f'id name {self.NAME}')
+            self.send(f'id author {self.AUTHOR}')
+            self.send('uciok')
+        elif name == 'isready':
+            self.send('readyok')
+        elif name == 'ucinewgame':
+            self.stop()
+            self.engine = Engine()
+            self.state = GameState()
+        elif name == 'position':
+            self.stop()
+            try:
+                self.position(args)
+            except (ValueError, IndexError, KeyError, AttributeError) as e:
+                self.send(f'info string bad position: {e}')
+        elif name == 'go':
+            self.stop()
+            self.go(args)
+        elif name == 'stop':
+            self.stop()
+        elif name == 'quit':
+            return False
+        return True
+
+    def position(self, args):
+        '''
+            Set up "startpos" or "fen <fen>", then play the moves after "moves".
+
+        '''
+        if 'moves' in args:
+            index = args.index('moves')
+            setup, moves = args[:index], args[index + 1:]
+        else:
+            setup, moves = args, []
+
+        if setup[0] == 'startpos':
+            fen = START_FEN
+        elif setup[0] == 'fen':
+            fen = ' '.join(setup[1:])
+        else:
+            raise ValueError(' '.join(args))
+
+        state = GameState.from_fen(fen)
+        for text in moves:
+            state.push_uci(text)
+        self.state = state
+
+    def go(self, args):
+        '''
+            Start a search of the current position on a background thread; bestmove is sent when it ends.
+
+        '''
+        options = {}
+        self.infinite = False
+        i = 0
+        while i < len(args):
+            if args[i] == 'infinite':
+                self.infinite = True
+            elif args[i] in ('depth', 'movetime', 'nodes', 'wtime', 'btime', 'winc', 'binc', 'movestogo') and i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError:
+                    self.send(f'info string bad go {args[i]}: {args[i + 1]}')
+                i += 1
+            i += 1
+
+        depth = options.get('depth')
+        nodes = options.get('nodes')
+        movetime = options.get('movetime')
+        if movetime is None and not self.infinite:
+            movetime = self.budget(options)
+        if self.infinite:
+            #without any limit the engine would fall back to its default movetime
+            depth = Engine.MAX_DEPTH
+            movetime = None
+            nodes = None
+        elif depth is None and movetime is None and nodes is None:
+            movetime = Engine.DEFAULT_MOVETIME
+
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.search, args=(depth, movetime, nodes), daemon=True)
+        self.thread.start()
+
+    def budget(self, options):
+        '''
+            Split the clock of the side to move over the rest of the game, or return None without a clock.
+
+        '''
+        side = 'w' if self.state.side_to_move() == 'white' else 'b'
+        if f'{side}time' not in options:
+            return None
+        left = options[f'{side}time']
+        inc = options.get(f'{side}inc', 0)
+        moves = options.get('movestogo', 30)
+        movetime = left // max(moves, 1) + inc * 3 // 4 - self.OVERHEAD
+        return max(10, min(movetime, left - self.OVERHEAD))
+
+    def search(self, depth, movetime, nodes):
+        board = self.state.board
+
+        def info(depth, score, nodes, seconds, move):
+            nps = int(nodes / seconds) if seconds else 0
+            self.send(f'info depth {depth} score {self.score(score)} nodes {nodes} nps {nps} '
+                      f'time {int(seconds * 1000)} pv {move.uci()}')
+
+        best, score = self.engine.search(board, depth, movetime, nodes, info)
+        #bestmove of an infinite search waits for stop, even after a mate was found
+        if self.infinite:
+            self.stopping.wait()
+        self.send(f'bestmove {best[1].uci() if best else "0000"}')
+
+    @staticmethod
+    def score(score):
+        if score >= MATE_BOUND:
+            return f'mate {(MATE - score + 1) // 2}'
+        if score <= -MATE_BOUND:
+            return f'mate {-((MATE + score) // 2)}'
+        return f'cp {score}'
+
+    def stop(self):
+        '''
+            Stop the running search, if any, and wait until it has sent bestmove.
+
+        '''
+        self.stopping.set()
+        while self.thread is not None and self.thread.is_alive():
+            #stop again until the search thread ends, in case it had not started the search yet
+            self.engine.stop()
+            self.thread.join(0.01)
+        self.thread = None
+
+
+def main():
+    UCI().loop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import random
+
+#fixed seed, so that the same position has the same key in every process
+_random = random.Random(20240611)
+
+#one key per piece per square, indexed by (color, name) and row * 8 + col
+PIECE_KEYS = {}
+for color in ('white', 'black'):
+    for name in ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king'):
+        PIECE_KEYS[(color, name)] = [_random.getrandbits(64) for sq in range(64)]
+
+#xored in when black is to move
+SIDE_KEY = _random.getrandbits(64)
+
+#one key per castling right, in the order white kingside, white queenside, black kingside, black queenside
+CASTLING_KEYS = [_random.getrandbits(64) for right in range(4)]
+
+#one key per column of a pawn that can be taken en passant
+EN_PASSANT_KEYS = [_random.getrandbits(64) for col in range(8)]
+
+
+def castling_key(rights):
+    key = 0
+    for i in range(4):
+        if rights & (1 << i):
+            key ^= CASTLING_KEYS[i]
+    return key